@@ -1,8 +1,11 @@
+import itertools
 import os
+import threading
 from _warnings import warn
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from contextlib import suppress
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 from panoptes.utils.images.cr2 import cr2_to_jpg
 from panoptes.utils.images.fits import fits_to_jpg
@@ -44,6 +47,11 @@ def make_pretty_image(fname,
         warn("File must be a Canon CR2 or FITS file.")
         return None
 
+    return _link_pretty_image(pretty_path, link_path)
+
+
+def _link_pretty_image(pretty_path, link_path=None) -> Path:
+    """Symlink `link_path` to the pretty image, returning the link or the image if not linked."""
     if link_path is None or not os.path.exists(os.path.dirname(link_path)):
         return Path(pretty_path)
 
@@ -57,3 +65,65 @@ def make_pretty_image(fname,
         warn(f"Can't link latest image: {e!r}")
 
     return Path(link_path)
+
+
+# The default executor for ~make_pretty_image_async, created when first used.
+_PRETTY_IMAGE_EXECUTOR: Optional[ProcessPoolExecutor] = None
+
+# The submission number of the image each `link_path` of ~make_pretty_image_async
+# points at, so an image that finishes late doesn't replace a newer one.
+_PRETTY_IMAGE_LINKS: Dict[str, int] = dict()
+_PRETTY_IMAGE_LINKS_LOCK = threading.Lock()
+_PRETTY_IMAGE_COUNTER = itertools.count()
+
+
+def make_pretty_image_async(fname,
+                            executor: Optional[Executor] = None,
+                            link_path=None,
+                            **kwargs) -> Future:
+    """Make a pretty image in the background.
+
+    This calls ~make_pretty_image in a separate process so the image can be
+    made while the next exposure is taken. The symlink at `link_path` is made
+    by the calling process once the image is done, and only if no image submitted
+    later has been linked already, so it always points at the most recent image.
+
+    Arguments:
+        fname (str): The path to the raw image.
+        executor (`concurrent.futures.Executor`, optional): The executor to use,
+            default None uses a shared process pool with two workers.
+        link_path (None|str, optional): Path to location that image should be symlinked.
+            The directory must exist.
+        **kwargs: Passed to ~make_pretty_image.
+
+    Returns:
+        `concurrent.futures.Future`: The future for the result of ~make_pretty_image.
+            This is the path of the image itself if a newer image was already linked.
+    """
+    global _PRETTY_IMAGE_EXECUTOR
+    if executor is None:
+        if _PRETTY_IMAGE_EXECUTOR is None:
+            _PRETTY_IMAGE_EXECUTOR = ProcessPoolExecutor(max_workers=2)
+        executor = _PRETTY_IMAGE_EXECUTOR
+
+    submission = next(_PRETTY_IMAGE_COUNTER)
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def _link(image_future):
+        try:
+            pretty_path = image_future.result()
+            if pretty_path is not None and link_path is not None:
+                link_key = os.fspath(link_path)
+                with _PRETTY_IMAGE_LINKS_LOCK:
+                    if submission > _PRETTY_IMAGE_LINKS.get(link_key, -1):
+                        pretty_path = _link_pretty_image(pretty_path, link_path)
+                        _PRETTY_IMAGE_LINKS[link_key] = submission
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(pretty_path)
+
+    executor.submit(make_pretty_image, fname, link_path=None, **kwargs).add_done_callback(_link)
+
+    return future
@@ -1,11 +1,17 @@
+import asyncio
+import mmap
 import os
 import shutil
 import subprocess
-from json import loads
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import suppress
+from datetime import datetime
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Union, Optional
+from typing import Union, Optional, List
 from warnings import warn
 
+import matplotlib
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from astropy.io import fits
@@ -15,6 +21,73 @@ from loguru import logger
 from panoptes.utils import error
 from panoptes.utils.images import fits as fits_utils
 
+try:
+    import rawpy
+except ImportError:  # pragma: no cover
+    rawpy = None
+
+try:
+    import exifread
+except ImportError:  # pragma: no cover
+    exifread = None
+
+try:
+    from orjson import loads
+except ImportError:  # pragma: no cover
+    from json import loads
+
+PGM_WHITESPACE = b' \t\r\n'
+
+# FITS keyword, exiftool name, default value and comment for the headers added from the CR2.
+CR2_EXIF_HEADERS = [
+    ('ISO', 'ISO', '', None),
+    ('EXPTIME', 'ExposureTime', 'Seconds', None),
+    ('CAMTEMP', 'CameraTemperature', '', 'Celsius - From CR2'),
+    ('CIRCCONF', 'CircleOfConfusion', '', 'From CR2'),
+    ('COLORTMP', 'ColorTempMeasured', '', 'From CR2'),
+    ('FILENAME', 'FileName', '', 'From CR2'),
+    ('INTSN', 'InternalSerialNumber', '', 'From CR2'),
+    ('CAMSN', 'SerialNumber', '', 'From CR2'),
+    ('MEASEV', 'MeasuredEV', '', 'From CR2'),
+    ('MEASEV2', 'MeasuredEV2', '', 'From CR2'),
+    ('MEASRGGB', 'MeasuredRGGB', '', 'From CR2'),
+    ('WHTLVLN', 'NormalWhiteLevel', '', 'From CR2'),
+    ('WHTLVLS', 'SpecularWhiteLevel', '', 'From CR2'),
+    ('REDBAL', 'RedBalance', '', 'From CR2'),
+    ('BLUEBAL', 'BlueBalance', '', 'From CR2'),
+    ('WBRGGB', 'WB RGGBLevelAsShot', '', 'From CR2'),
+]
+
+# Map of exiftool names to the exifread tag names.
+EXIFREAD_TAGS = {
+    'DateTimeOriginal': 'EXIF DateTimeOriginal',
+    'ISO': 'EXIF ISOSpeedRatings',
+    'ExposureTime': 'EXIF ExposureTime',
+    'CameraTemperature': 'MakerNote CameraTemperature',
+    'MeasuredEV': 'MakerNote MeasuredEV',
+    'SerialNumber': 'MakerNote SerialNumber',
+    'InternalSerialNumber': 'MakerNote InternalSerialNumber',
+}
+
+
+# Monospace font shipped with matplotlib, used for the JPG titles.
+TITLE_FONT_PATH = os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSansMono.ttf')
+
+# Paths to the external tools, looked up once. See ~refresh_tool_paths.
+_DCRAW = shutil.which('dcraw')
+_EXIFTOOL = shutil.which('exiftool')
+
+
+def refresh_tool_paths():
+    """Look up the paths to `dcraw` and `exiftool` again.
+
+    The paths are only looked up when the module is imported so this should be
+    called if either tool is installed (or `PATH` changes) afterwards.
+    """
+    global _DCRAW, _EXIFTOOL
+    _DCRAW = shutil.which('dcraw')
+    _EXIFTOOL = shutil.which('exiftool')
+
 
 def cr2_to_fits(
         cr2_fname: Union[str, Path],
@@ -23,14 +96,16 @@ def cr2_to_fits(
         headers: dict = None,
         fits_headers: dict = None,
         remove_cr2: bool = False,
+        compress: bool = False,
         **kwargs) -> Union[Path, None]:  # pragma: no cover
     """Convert a CR2 file to FITS.
 
-    This is a convenience function that first converts the CR2 to PGM via ~cr2_to_pgm.
-    Also adds keyword headers to the FITS file.
+    This is a convenience function that first reads the raw Bayer data via
+    ~cr2_to_bayer_array. Also adds keyword headers to the FITS file.
 
     Note:
-        The intermediate PGM file is automatically removed
+        If `rawpy` is not installed the CR2 is converted via an intermediate PGM
+        file, which is automatically removed.
 
     Arguments:
         cr2_fname (str): Name of the CR2 file to be converted.
@@ -40,6 +115,9 @@ def cr2_to_fits(
         headers (dict, optional): Header data added to the FITS file.
         fits_headers (dict, optional): Header data added to the FITS file without filtering.
         remove_cr2 (bool, optional): If CR2 should be removed after processing, default False.
+        compress (bool, optional): Write the data as a Rice tile-compressed image
+            extension, default False. This is lossless and typically yields a file
+            2-3x smaller. The default `fits_fname` then ends in `.fits.fz`.
         **kwargs: Description
 
     Returns:
@@ -59,58 +137,68 @@ def cr2_to_fits(
         fits_fname = str(fits_fname)
 
     if fits_fname is None:
-        fits_fname = cr2_fname.replace('.cr2', '.fits')
+        fits_fname = cr2_fname.replace('.cr2', '.fits.fz' if compress else '.fits')
 
     if not os.path.exists(fits_fname) or overwrite:
-        logger.debug(f'Converting CR2 to PGM: {cr2_fname}')
+        logger.debug(f'Reading Bayer data from CR2: {cr2_fname}')
 
-        # Convert the CR2 to a PGM file then delete PGM
         try:
-            pgm = read_pgm(cr2_to_pgm(cr2_fname), remove_after=True)
+            pgm = cr2_to_bayer_array(cr2_fname)
         except error.InvalidSystemCommand:
-            logger.warning(f'No dcraw on the system, cannot proceed.')
+            logger.warning(f'Unable to read Bayer data from {cr2_fname}, cannot proceed.')
             return None
 
         # Add the EXIF information from the CR2 file
         exif = read_exif(cr2_fname)
 
-        # Set the PGM as the primary data for the FITS file
-        hdu = fits.PrimaryHDU(pgm)
+        # Set the PGM as the primary data for the FITS file, or as a compressed
+        # image extension following an empty primary HDU.
+        if compress:
+            hdu = fits.CompImageHDU(pgm, compression_type='RICE_1')
+            hdul = fits.HDUList([fits.PrimaryHDU(), hdu])
+        else:
+            hdu = fits.PrimaryHDU(pgm)
+            hdul = hdu
 
-        obs_date = date_parse(exif.get('DateTimeOriginal', '').replace(':', '-', 2)).isoformat()
+        obs_date = _parse_exif_dt(exif.get('DateTimeOriginal', '')).isoformat()
 
         # Set some default headers
-        hdu.header.set('FILTER', 'RGGB')
-        hdu.header.set('ISO', exif.get('ISO', ''))
-        hdu.header.set('EXPTIME', exif.get('ExposureTime', 'Seconds'))
-        hdu.header.set('CAMTEMP', exif.get('CameraTemperature', ''), 'Celsius - From CR2')
-        hdu.header.set('CIRCCONF', exif.get('CircleOfConfusion', ''), 'From CR2')
-        hdu.header.set('COLORTMP', exif.get('ColorTempMeasured', ''), 'From CR2')
-        hdu.header.set('FILENAME', exif.get('FileName', ''), 'From CR2')
-        hdu.header.set('INTSN', exif.get('InternalSerialNumber', ''), 'From CR2')
-        hdu.header.set('CAMSN', exif.get('SerialNumber', ''), 'From CR2')
-        hdu.header.set('MEASEV', exif.get('MeasuredEV', ''), 'From CR2')
-        hdu.header.set('MEASEV2', exif.get('MeasuredEV2', ''), 'From CR2')
-        hdu.header.set('MEASRGGB', exif.get('MeasuredRGGB', ''), 'From CR2')
-        hdu.header.set('WHTLVLN', exif.get('NormalWhiteLevel', ''), 'From CR2')
-        hdu.header.set('WHTLVLS', exif.get('SpecularWhiteLevel', ''), 'From CR2')
-        hdu.header.set('REDBAL', exif.get('RedBalance', ''), 'From CR2')
-        hdu.header.set('BLUEBAL', exif.get('BlueBalance', ''), 'From CR2')
-        hdu.header.set('WBRGGB', exif.get('WB RGGBLevelAsShot', ''), 'From CR2')
-        hdu.header.set('DATE-OBS', obs_date)
-
-        for key, value in fits_headers.items():
-            try:
-                hdu.header.set(key.upper()[0: 8], value)
-            except Exception:
-                pass
-
+        cards = [('FILTER', 'RGGB')]
+        for keyword, exif_key, default, comment in CR2_EXIF_HEADERS:
+            value = exif.get(exif_key)
+            if value is None:
+                value = default
+            cards.append((keyword, value, comment))
+        cards.append(('DATE-OBS', obs_date))
+
+        hdu.header.update(cards)
+
+        # Add the extra headers in one update, only going key by key (and skipping
+        # the bad ones) if one of them is invalid.
+        extra_headers = {key.upper()[:8]: value
+                         for key, value in fits_headers.items()
+                         if isinstance(key, str)}
+        try:
+            hdu.header.update(extra_headers)
+        except ValueError:
+            for key, value in extra_headers.items():
+                try:
+                    hdu.header.set(key, value)
+                except Exception:
+                    pass
+
+        # Write to a temporary file and rename it into place so that a partially
+        # written FITS file is never left under the final name.
+        tmp_fname = f'{fits_fname}.tmp.{os.getpid()}'
         try:
             logger.debug(f'Saving fits file to: {fits_fname}')
 
-            hdu.writeto(fits_fname, output_verify='silentfix', overwrite=overwrite)
+            hdul.writeto(tmp_fname, output_verify='silentfix', overwrite=True, checksum=False)
+            os.replace(tmp_fname, fits_fname)
         except Exception as e:
             warn(f'Problem writing FITS file: {e}')
+            with suppress(FileNotFoundError):
+                os.remove(tmp_fname)
         else:
             if remove_cr2:
                 os.unlink(cr2_fname)
@@ -120,6 +208,140 @@ def cr2_to_fits(
     return Path(fits_fname)
 
 
+def cr2_batch_to_fits(
+        cr2_list: List[Union[str, Path]],
+        max_workers: Optional[int] = None,
+        **kwargs) -> List[Union[Path, None]]:  # pragma: no cover
+    """Convert a number of CR2 files to FITS in parallel.
+
+    Each file is converted with ~cr2_to_fits in a separate process. The
+    conversions are independent so this scales with the number of workers,
+    however note that each worker holds a full frame (~50 MB) in memory.
+
+    Arguments:
+        cr2_list (list): The CR2 files to be converted.
+        max_workers (int, optional): The number of worker processes, default
+            `None` which uses the number of processors on the machine.
+        **kwargs: Passed to ~cr2_to_fits for each file. Note that `fits_fname`
+            should not be passed as each FITS file is named after its CR2 file.
+
+    Returns:
+        list: The paths to the generated FITS files in the same order as
+            `cr2_list`. A `None` entry indicates that file could not be converted.
+    """
+    # Only prefetch a couple of files per worker ahead of the conversions, prefetching
+    # all of them would evict the early files from the page cache before they are read.
+    window = 2 * (max_workers or os.cpu_count() or 1)
+    convert = partial(cr2_to_fits, **kwargs)
+
+    futures = list()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for i, cr2_fname in enumerate(cr2_list):
+            if i >= window:
+                wait([futures[i - window]])
+            prefetch_files([cr2_fname])
+            futures.append(executor.submit(convert, cr2_fname))
+
+    fits_fnames = list()
+    for cr2_fname, future in zip(cr2_list, futures):
+        try:
+            fits_fnames.append(future.result())
+        except Exception as e:
+            logger.warning(f'Could not convert {cr2_fname} to FITS: {e!r}')
+            fits_fnames.append(None)
+
+    return fits_fnames
+
+
+def prefetch_files(fnames: List[Union[str, Path]]) -> None:
+    """Ask the kernel to start reading the given files into the page cache.
+
+    Each file is opened and marked with `POSIX_FADV_WILLNEED`, which queues the
+    reads in the background and returns immediately, so the later reads by the
+    conversion workers are served from memory rather than blocking on the disk.
+
+    This is a no-op on platforms without `os.posix_fadvise` (e.g. macOS). Files
+    that cannot be opened are skipped; the error will surface when they are
+    converted.
+
+    Arguments:
+        fnames (list): The files to prefetch.
+    """
+    if not hasattr(os, 'posix_fadvise'):  # pragma: no cover
+        return
+
+    for fname in fnames:
+        try:
+            fd = os.open(fname, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:  # pragma: no cover
+            pass
+        finally:
+            os.close(fd)
+
+
+def cr2_to_bayer_array(cr2_fname):  # pragma: no cover
+    """Read the raw Bayer data from a CR2 file.
+
+    Decodes the CR2 in-process with `rawpy` (libraw) when available, which avoids
+    writing and re-reading an intermediate PGM file. If `rawpy` is not installed
+    this falls back to `dcraw`, reading the PGM output directly from stdout via
+    ~cr2_decode_bytes.
+
+    The data is flipped vertically to match the orientation of the PGM output.
+
+    Arguments:
+        cr2_fname (str): Name of the CR2 file to read.
+
+    Returns:
+        numpy.array: The raw (visible) Bayer data as unsigned 16-bit integers.
+    """
+    if rawpy is None:
+        return _parse_pgm_buffer(cr2_decode_bytes(cr2_fname))
+
+    try:
+        with rawpy.imread(cr2_fname) as raw:
+            # The visible image is a view into libraw memory so a copy is required,
+            # but flip while copying so only a single copy is made.
+            data = np.flipud(raw.raw_image_visible).astype('<u2', order='C')
+    except rawpy.LibRawError as err:
+        raise error.InvalidSystemCommand(msg=f"File: {cr2_fname} \n err: {err!r}")
+
+    return data
+
+
+def cr2_decode_bytes(cr2_fname):  # pragma: no cover
+    """Decode a CR2 file to PGM bytes via `dcraw`.
+
+    This runs `dcraw` with the same options as ~cr2_to_pgm but writes the PGM
+    to stdout, so no intermediate file is written to disk. The returned bytes
+    can be parsed with ~_parse_pgm_buffer.
+
+    Arguments:
+        cr2_fname (str): Name of CR2 file to convert.
+
+    Returns:
+        bytes: The PGM file contents.
+    """
+    dcraw = _DCRAW
+    if dcraw is None:
+        raise error.InvalidCommand('dcraw not found')
+
+    cmd_list = [dcraw, '-c', '-t', '0', '-D', '-4', cr2_fname]
+    logger.debug(f'PGM Conversion command: \n {cmd_list}')
+
+    try:
+        proc = subprocess.run(cmd_list, check=True, stdout=subprocess.PIPE,
+                              stdin=subprocess.DEVNULL, close_fds=False)
+    except subprocess.CalledProcessError as err:
+        raise error.InvalidSystemCommand(msg=f"File: {cr2_fname} \n err: {err}")
+
+    return proc.stdout
+
+
 def cr2_to_pgm(
         cr2_fname,
         pgm_fname=None,
@@ -148,7 +370,7 @@ def cr2_to_pgm(
         str -- Filename of PGM that was created
 
     """
-    dcraw = shutil.which('dcraw')
+    dcraw = _DCRAW
     if dcraw is None:
         raise error.InvalidCommand('dcraw not found')
 
@@ -160,12 +382,11 @@ def cr2_to_pgm(
     else:
         try:
             # Build the command for this file
-            command = f'{dcraw} -t 0 -D -4 {cr2_fname}'
-            cmd_list = command.split()
+            cmd_list = [dcraw, '-t', '0', '-D', '-4', cr2_fname]
             logger.debug(f'PGM Conversion command: \n {cmd_list}')
 
             # Run the command
-            if subprocess.check_call(cmd_list) == 0:
+            if subprocess.check_call(cmd_list, stdin=subprocess.DEVNULL, close_fds=False) == 0:
                 logger.debug('PGM Conversion command successful')
 
         except subprocess.CalledProcessError as err:
@@ -177,10 +398,15 @@ def cr2_to_pgm(
 def read_exif(fname, exiftool='exiftool'):  # pragma: no cover
     """ Read the EXIF information
 
-    Gets the EXIF information using exiftool
+    Gets the EXIF information using exiftool. If `exiftool` is not installed
+    (or `exiftool=None` is passed) and `exifread` is available then the EXIF
+    information is read in-process instead, see ~_read_exif_inproc.
 
     Note:
-        Assumes the `exiftool` is installed
+        The in-process reader is much faster but only provides the standard
+        EXIF tags and some of the Canon MakerNotes. Values that `exiftool`
+        derives from the camera specific color data (e.g. `MeasuredRGGB`) will
+        be missing.
 
     Args:
         fname {str} -- Name of file (CR2) to read
@@ -192,22 +418,84 @@ def read_exif(fname, exiftool='exiftool'):  # pragma: no cover
         dict -- Dictionary of EXIF information
 
     """
-    assert os.path.exists(fname), warn(f"File does not exist: {fname}")
+    if not os.path.exists(fname):
+        raise FileNotFoundError(f"File does not exist: {fname}")
+
+    if exiftool == 'exiftool':
+        exiftool = _EXIFTOOL
+    elif exiftool is not None:
+        exiftool = shutil.which(exiftool)
+
+    if exiftool is None:
+        if exifread is None:
+            raise error.InvalidCommand('exiftool not found')
+
+        return _read_exif_inproc(fname)
+
     exif = {}
 
     try:
         # Build the command for this file
-        command = f'{exiftool} -j {fname}'
-        cmd_list = command.split()
+        cmd_list = [exiftool, '-j', fname]
 
         # Run the command
-        exif = loads(subprocess.check_output(cmd_list).decode('utf-8'))
+        exif = loads(subprocess.check_output(cmd_list, stdin=subprocess.DEVNULL, close_fds=False))
     except subprocess.CalledProcessError as err:
         raise error.InvalidSystemCommand(msg=f"File: {fname} \n err: {err}")
 
     return exif[0]
 
 
+def _read_exif_inproc(fname):  # pragma: no cover
+    """Read the EXIF information in-process with `exifread`.
+
+    The returned dict uses the same key names as `exiftool` for the tags that
+    are available, see `EXIFREAD_TAGS`.
+
+    Args:
+        fname (str): Name of file (CR2) to read.
+
+    Returns:
+        dict: Dictionary of EXIF information.
+    """
+    with open(fname, 'rb') as f:
+        tags = exifread.process_file(f, details=True)
+
+    # Some versions of exifread have trailing whitespace in the tag names.
+    tags = {tag_name.strip(): tag for tag_name, tag in tags.items()}
+
+    exif = dict(FileName=os.path.basename(fname))
+    for exif_key, tag_name in EXIFREAD_TAGS.items():
+        tag = tags.get(tag_name)
+        if tag is None:
+            continue
+
+        values = tag.values
+        if isinstance(values, list) and len(values) == 1 and isinstance(values[0], int):
+            exif[exif_key] = values[0]
+        else:
+            exif[exif_key] = str(tag.printable).strip()
+
+    return exif
+
+
+def _parse_exif_dt(exif_dt: str) -> datetime:
+    """Parse an EXIF timestamp.
+
+    EXIF timestamps have the fixed format `YYYY:MM:DD HH:MM:SS` so try that
+    directly before falling back to the (much slower) generic parser.
+
+    >>> _parse_exif_dt('2016:09:09 08:11:52')
+    datetime.datetime(2016, 9, 9, 8, 11, 52)
+    >>> _parse_exif_dt('2016:09:09 08:11:52.25')
+    datetime.datetime(2016, 9, 9, 8, 11, 52, 250000)
+    """
+    try:
+        return datetime.strptime(exif_dt, '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return date_parse(exif_dt.replace(':', '-', 2))
+
+
 def read_pgm(fname, byteorder='>', remove_after=False):  # pragma: no cover
     """Return image data from a raw PGM file as numpy array.
 
@@ -230,27 +518,66 @@ def read_pgm(fname, byteorder='>', remove_after=False):  # pragma: no cover
         numpy.array:        The raw data from the PGMx
 
     """
-
+    # Map the file rather than reading it into an intermediate bytes object.
+    # The parsed data is a copy so the map can be released straight away.
     with open(fname, 'rb') as f:
-        buffer = f.read()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            data = _parse_pgm_buffer(buffer, byteorder=byteorder)
+
+    if remove_after:
+        os.remove(fname)
 
-    # We know our header info is 19 chars long
-    header_offset = 19
+    return data
 
-    img_type, img_size, img_max_value, _ = buffer[
-                                           0:header_offset].decode().split('\n')
 
-    assert img_type == 'P5', warn("Not a PGM file")
+def _parse_pgm_buffer(buffer, byteorder='>'):  # pragma: no cover
+    """Return image data from the contents of a raw PGM file as numpy array.
 
-    # Get the width and height (as strings)
-    width, height = img_size.split(' ')
+    See ~read_pgm for details.
 
-    data = np.flipud(np.frombuffer(buffer[header_offset:],
-                                   dtype=byteorder + 'u2',
-                                   ).reshape((int(height), int(width))))
+    Args:
+        buffer(bytes):      The contents of a PGM file, any bytes-like object
+                            (e.g. `bytearray` or `mmap.mmap`) can be used.
+        byteorder(str):     Big endian
 
-    if remove_after:
-        os.remove(fname)
+    Returns:
+        numpy.array:        The raw data from the PGM, flipped and in native
+                            byte order. This is a copy and does not reference
+                            `buffer`.
+    """
+    # Header is four whitespace separated tokens: magic, width, height and max value.
+    tokens = list()
+    pos = 0
+    try:
+        while len(tokens) < 4:
+            while buffer[pos] in PGM_WHITESPACE:
+                pos += 1
+            start = pos
+            while buffer[pos] not in PGM_WHITESPACE:
+                pos += 1
+            tokens.append(bytes(buffer[start:pos]))
+    except IndexError:
+        raise ValueError('Incomplete PGM header')
+
+    # A single whitespace character separates the header from the data.
+    header_end = pos + 1
+
+    img_type, width, height, max_value = tokens
+    if img_type != b'P5':
+        raise ValueError('Not a PGM file')
+
+    width = int(width)
+    height = int(height)
+    dtype = byteorder + 'u2' if int(max_value) > 255 else 'u1'
+
+    # Flip and swap to native byte order in a single copy. NumPy does the swap
+    # as part of the cast so this is one memory bound pass over the frame.
+    data = np.frombuffer(buffer,
+                         dtype=dtype,
+                         count=width * height,
+                         offset=header_end,
+                         ).reshape((height, width))[::-1]
+    data = data.astype(data.dtype.newbyteorder('='))
 
     return data
 
@@ -263,43 +590,160 @@ def cr2_to_jpg(
         remove_cr2: bool = False,
 ) -> Optional[Path]:
     """Extract a JPG image from a CR2, return the new path name."""
-    exiftool = shutil.which('exiftool')
+    exiftool, cr2_fname, jpg_fname = _check_jpg_names(cr2_fname, jpg_fname, overwrite)
+
+    # Let exiftool write straight into the file descriptor so the JPG data
+    # doesn't pass through this process at all.
+    cmd = [exiftool, '-b', '-PreviewImage', cr2_fname.as_posix()]
+    with jpg_fname.open('wb') as jpg_file:
+        comp_proc = subprocess.run(cmd, check=True, stdout=jpg_file,
+                                   stdin=subprocess.DEVNULL, close_fds=False)
+
+    if comp_proc.returncode != 0:  # pragma: no cover
+        raise error.InvalidSystemCommand(f'{comp_proc.returncode}')
+
+    _finish_jpg(cr2_fname, jpg_fname, title=title, remove_cr2=remove_cr2)
+
+    return jpg_fname
+
+
+def _check_jpg_names(cr2_fname, jpg_fname=None, overwrite=False):
+    """Return the exiftool command and the CR2 and JPG paths for ~cr2_to_jpg.
+
+    Raises:
+        error.InvalidSystemCommand: If exiftool isn't installed.
+        error.AlreadyExists: If the JPG exists and `overwrite` is False.
+    """
+    exiftool = _EXIFTOOL
     if not exiftool:  # pragma: no cover
         raise error.InvalidSystemCommand('exiftool not found')
 
+    cr2_fname = Path(cr2_fname)
     jpg_fname = Path(jpg_fname) if jpg_fname else cr2_fname.with_suffix('.jpg')
 
     if jpg_fname.exists() and overwrite is False:
         raise error.AlreadyExists(f'{jpg_fname} already exists and overwrite is False')
 
-    cmd = [exiftool, '-b', '-PreviewImage', cr2_fname.as_posix()]
-    comp_proc = subprocess.run(cmd, check=True, stdout=jpg_fname.open('wb'))
+    return exiftool, cr2_fname, jpg_fname
 
-    if comp_proc.returncode != 0:  # pragma: no cover
-        raise error.InvalidSystemCommand(f'{comp_proc.returncode}')
 
+def _finish_jpg(cr2_fname, jpg_fname, title='', remove_cr2=False):
+    """Add the title to the extracted JPG and remove the CR2 if requested, see ~cr2_to_jpg."""
     if title and title > '':
-        try:
-            im = Image.open(jpg_fname)
-            id = ImageDraw.Draw(im)
+        _add_title(jpg_fname, title)
 
-            im.info['title'] = title
+    if remove_cr2:
+        logger.debug(f'Removing {cr2_fname}')
+        cr2_fname.unlink()
 
-            try:
-                fnt = ImageFont.truetype('FreeMono.ttf', 120)
-            except Exception:  # pragma: no cover
-                fnt = ImageFont.load_default()
-            bottom_padding = 25
-            position = (im.size[0] / 2, im.size[1] - bottom_padding)
-            id.text(position, title, font=fnt, fill=(255, 0, 0), anchor='ms')
 
-            print(f'Adding title={title} to {jpg_fname.as_posix()}')
-            im.save(jpg_fname)
-        except Exception:
-            raise error.InvalidSystemCommand(f'Error adding title to {jpg_fname.as_posix()}')
+async def cr2_to_jpg_async(
+        cr2_fname: Path,
+        jpg_fname: str = None,
+        title: str = '',
+        overwrite: bool = False,
+        remove_cr2: bool = False,
+        semaphore: Optional[asyncio.Semaphore] = None,
+) -> Optional[Path]:
+    """Extract a JPG image from a CR2 without blocking the event loop.
 
-    if remove_cr2:
-        print(f'Removing {cr2_fname}')
-        cr2_fname.unlink()
+    This is the same as ~cr2_to_jpg but runs `exiftool` as an asyncio subprocess
+    so that many extractions can be run concurrently, see ~cr2_batch_to_jpg.
+
+    Args:
+        cr2_fname (Path): Path to the CR2 file.
+        jpg_fname (str, optional): Path to the JPG file, default is the CR2 name.
+        title (str, optional): Title to add to the JPG.
+        overwrite (bool, optional): Overwrite an existing JPG file, default False.
+        remove_cr2 (bool, optional): Remove the CR2 file after conversion, default False.
+        semaphore (asyncio.Semaphore, optional): Limits the number of running
+            `exiftool` processes if given.
+
+    Returns:
+        Path: The path to the JPG file.
+    """
+    exiftool, cr2_fname, jpg_fname = _check_jpg_names(cr2_fname, jpg_fname, overwrite)
+
+    semaphore = semaphore or asyncio.Semaphore(1)
+    async with semaphore:
+        proc = await asyncio.create_subprocess_exec(exiftool, '-b', '-PreviewImage',
+                                                    cr2_fname.as_posix(),
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stdin=asyncio.subprocess.DEVNULL,
+                                                    close_fds=False)
+        jpg_data, _ = await proc.communicate()
+
+    if proc.returncode != 0:  # pragma: no cover
+        raise error.InvalidSystemCommand(f'{proc.returncode}')
+
+    # Write and add the title in a thread so the event loop isn't blocked.
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, jpg_fname.write_bytes, jpg_data)
+    await loop.run_in_executor(None, partial(_finish_jpg, cr2_fname, jpg_fname,
+                                             title=title, remove_cr2=remove_cr2))
 
     return jpg_fname
+
+
+def cr2_batch_to_jpg(cr2_list: List[Path],
+                     max_parallel: int = 8,
+                     **kwargs) -> List[Optional[Path]]:
+    """Extract the JPG images from a number of CR2 files concurrently.
+
+    Args:
+        cr2_list (list): The CR2 files.
+        max_parallel (int, optional): Maximum number of `exiftool` processes to
+            run at once, default 8.
+        **kwargs: Passed to ~cr2_to_jpg_async for each file.
+
+    Returns:
+        list: The paths to the JPG files in the same order as `cr2_list`. A `None`
+            entry indicates the JPG could not be extracted from that file.
+    """
+
+    async def _extract_all():
+        semaphore = asyncio.Semaphore(max_parallel)
+        return await asyncio.gather(*[cr2_to_jpg_async(cr2_fname, semaphore=semaphore, **kwargs)
+                                      for cr2_fname in cr2_list],
+                                    return_exceptions=True)
+
+    jpg_fnames = list()
+    for cr2_fname, result in zip(cr2_list, asyncio.run(_extract_all())):
+        if isinstance(result, Exception):
+            logger.warning(f'Could not extract JPG from {cr2_fname}: {result!r}')
+            result = None
+        jpg_fnames.append(result)
+
+    return jpg_fnames
+
+
+@lru_cache(maxsize=4)
+def _load_font(size: int):
+    """Load (and cache) the font used for the JPG titles."""
+    try:
+        return ImageFont.truetype(TITLE_FONT_PATH, size)
+    except Exception:  # pragma: no cover
+        return ImageFont.load_default()
+
+
+def _add_title(jpg_fname: Path, title: str):
+    """Add a title to the bottom of a JPG image.
+
+    The image is saved with the quantization tables and subsampling of the
+    original so the re-encode doesn't lower the quality.
+    """
+    try:
+        im = Image.open(jpg_fname)
+        id = ImageDraw.Draw(im)
+
+        im.info['title'] = title
+
+        fnt = _load_font(120)
+        bottom_padding = 25
+        position = (im.size[0] / 2, im.size[1] - bottom_padding)
+        id.text(position, title, font=fnt, fill=(255, 0, 0), anchor='ms')
+
+        print(f'Adding title={title} to {jpg_fname.as_posix()}')
+        im.save(jpg_fname, 'JPEG', quality='keep', subsampling='keep')
+    except Exception:
+        raise error.InvalidSystemCommand(f'Error adding title to {jpg_fname.as_posix()}')
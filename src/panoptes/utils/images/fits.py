@@ -1,17 +1,24 @@
+import io
 import os
 import re
 import shutil
 import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Pattern, Union, Dict
+from typing import Pattern, Union, Dict, List, Optional, Tuple
 from warnings import warn
 
+import numpy as np
 from astropy import units as u
 from astropy.io import fits
 from astropy.time import Time
-from astropy.visualization import ImageNormalize, PercentileInterval, LogStretch
+from astropy.visualization import ImageNormalize, ManualInterval, LogStretch
 from astropy.wcs import WCS
 from dateutil.parser import parse as parse_date
 from dateutil.tz import UTC
@@ -24,6 +31,8 @@ from panoptes.utils.images.misc import mask_saturated
 from panoptes.utils.images.plot import get_palette, add_colorbar
 from panoptes.utils.time import flatten_time
 
+# Note: ObservationPathInfo parses paths with the equivalent (non-backtracking)
+# ~_parse_observation_path, this is kept for matching paths directly.
 PATH_MATCHER: Pattern[str] = re.compile(r"""^
                                 (?P<pre_info>.*)?                       # Anything before unit_id
                                 (?P<unit_id>PAN\d{3})                   # unit_id   - PAN + 3 digits
@@ -35,8 +44,68 @@ PATH_MATCHER: Pattern[str] = re.compile(r"""^
                                 $""",
                                         re.VERBOSE)
 
+# Anchored patterns for the path components, used by ~_parse_observation_path.
+_UNIT_RE: Pattern[str] = re.compile(r'PAN\d{3}')
+_CAMERA_RE: Pattern[str] = re.compile(r'[a-gA-G0-9]{6}')
+_TIME_RE: Pattern[str] = re.compile(r'[0-9]{8}T[0-9]{6}')
 
-@dataclass
+
+def _parse_observation_path(path: str) -> Optional[Tuple[str, str, str, str, str]]:
+    """Split an observation path into its components.
+
+    This gives the same result as matching with `PATH_MATCHER` but scans the
+    path components from the right rather than backtracking over the string.
+
+    Returns:
+        tuple or None: The `(unit_id, field_name, camera_id, sequence_time, image_time)`
+            or `None` if the path doesn't match.
+    """
+    parts = path.split('/')
+
+    # Find the last camera_id/sequence_time/image_time triplet.
+    for i in range(len(parts) - 3, 0, -1):
+        camera_id, sequence_time, image_part = parts[i:i + 3]
+        if (_CAMERA_RE.fullmatch(camera_id) and
+                _TIME_RE.fullmatch(sequence_time) and
+                _TIME_RE.match(image_part)):
+            break
+    else:
+        return None
+
+    # The unit_id is the last one before the camera_id.
+    prefix = '/'.join(parts[:i])
+    end = len(prefix)
+    while True:
+        start = prefix.rfind('PAN', 0, end)
+        if start == -1:
+            return None
+        if _UNIT_RE.match(prefix, start):
+            break
+        end = start + 2
+
+    # Anything between the unit_id and the camera_id is the (legacy) field name.
+    field_name = prefix[start + 6:]
+    if field_name.startswith('/'):
+        field_name = field_name[1:]
+
+    return prefix[start:start + 6], field_name, camera_id, sequence_time, image_part[:15]
+
+
+def _parse_compact_dt(dt_str: str) -> datetime:
+    """Parse a compact `YYYYMMDDTHHMMSS` time string as used in the ids.
+
+    >>> _parse_compact_dt('20180824T035917')
+    datetime.datetime(2018, 8, 24, 3, 59, 17)
+    """
+    return datetime(int(dt_str[0:4]), int(dt_str[4:6]), int(dt_str[6:8]),
+                    int(dt_str[9:11]), int(dt_str[11:13]), int(dt_str[13:15]))
+
+
+# Use slots for the dataclass where supported (Python 3.10+).
+_DATACLASS_OPTIONS = dict(slots=True) if sys.version_info >= (3, 10) else dict()
+
+
+@dataclass(**_DATACLASS_OPTIONS)
 class ObservationPathInfo:
     """Parse the location path for an image.
 
@@ -86,15 +155,18 @@ class ObservationPathInfo:
     def __post_init__(self):
         """Parse the path when provided upon initialization."""
         if self.path is not None:
-            path_match = PATH_MATCHER.match(self.path)
-            if path_match is None:
+            path_parts = _parse_observation_path(str(self.path))
+            if path_parts is None:
                 raise ValueError(f'Invalid path received: {self.path}')
 
-            self.unit_id = path_match.group('unit_id')
-            self.camera_id = path_match.group('camera_id')
-            self.field_name = path_match.group('field_name')
-            self.sequence_time = Time(parse_date(path_match.group('sequence_time')))
-            self.image_time = Time(parse_date(path_match.group('image_time')))
+            self.unit_id, self.field_name, self.camera_id, sequence_time, image_time = path_parts
+            self.sequence_time = Time(_parse_compact_dt(sequence_time),
+                                      format='datetime', scale='utc')
+            self.image_time = Time(_parse_compact_dt(image_time), format='datetime', scale='utc')
+
+    def _flat_times(self) -> Tuple[str, str]:
+        """The flattened sequence and image times."""
+        return flatten_time(self.sequence_time), flatten_time(self.image_time)
 
     @property
     def id(self):
@@ -104,20 +176,20 @@ class ObservationPathInfo:
     @property
     def sequence_id(self) -> str:
         """The sequence id."""
-        return f'{self.unit_id}_{self.camera_id}_{flatten_time(self.sequence_time)}'
+        return f'{self.unit_id}_{self.camera_id}_{self._flat_times()[0]}'
 
     @property
     def image_id(self) -> str:
         """The matched image id."""
-        return f'{self.unit_id}_{self.camera_id}_{flatten_time(self.image_time)}'
+        return f'{self.unit_id}_{self.camera_id}_{self._flat_times()[1]}'
 
     def as_path(self, base: Union[Path, str] = None, ext: str = None) -> Path:
         """Return a Path object."""
-        image_str = flatten_time(self.image_time)
+        sequence_str, image_str = self._flat_times()
         if ext is not None:
             image_str = f'{image_str}.{ext}'
 
-        full_path = Path(self.unit_id, self.camera_id, flatten_time(self.sequence_time), image_str)
+        full_path = Path(self.unit_id, self.camera_id, sequence_str, image_str)
 
         if base is not None:
             full_path = base / full_path
@@ -129,8 +201,7 @@ class ObservationPathInfo:
         return f'{sep}'.join([
             self.unit_id,
             self.camera_id,
-            flatten_time(self.sequence_time),
-            flatten_time(self.image_time)
+            *self._flat_times()
         ])
 
     @classmethod
@@ -145,8 +216,10 @@ class ObservationPathInfo:
 
             new_instance = cls(unit_id=unit_id,
                                camera_id=camera_id,
-                               sequence_time=Time(parse_date(sequence_time)),
-                               image_time=Time(parse_date(image_time)))
+                               sequence_time=Time(_parse_compact_dt(sequence_time),
+                                                  format='datetime', scale='utc'),
+                               image_time=Time(_parse_compact_dt(image_time),
+                                               format='datetime', scale='utc'))
 
         return new_instance
 
@@ -155,6 +228,77 @@ class ObservationPathInfo:
         return cls.from_fits_header(getheader(fits_file))
 
 
+def _is_fz(fn: str) -> bool:
+    """Check if the filename is for a (fpack) compressed FITS file."""
+    return fn.endswith('.fz')
+
+
+def _which(name: str) -> Optional[str]:
+    """Look up the path to an external tool, see ~_which_cached."""
+    return _which_cached(name, os.environ.get('PATH'))
+
+
+@lru_cache(maxsize=32)
+def _which_cached(name: str, search_path: Optional[str]) -> Optional[str]:
+    """Cached `shutil.which`, keyed on the `PATH` so a changed `PATH` is searched again.
+
+    Call `_which_cached.cache_clear()` if a tool is installed into a directory
+    already on the `PATH`.
+    """
+    return shutil.which(name, path=search_path)
+
+
+@contextmanager
+def _open_fits(fn):
+    """Open a FITS file read-only and yield the `HDUList` and the image extension.
+
+    This allows the data and header to be read with a single open of the file.
+    """
+    fn = os.fspath(fn)
+    with fits.open(fn, mode='readonly', lazy_load_hdus=True) as hdul:
+        yield hdul, (1 if _is_fz(fn) else 0)
+
+
+def _is_celestial_header(header) -> bool:
+    """Check if the header has a celestial WCS without always building the WCS.
+
+    The common cases, no `CTYPE` keywords (unsolved) or a longitude/latitude
+    pair of `CTYPE1`/`CTYPE2` (solved), are decided from the keywords directly.
+    Anything else falls back to `astropy.wcs.WCS.is_celestial`.
+
+    >>> _is_celestial_header({'CTYPE1': 'RA---TAN-SIP', 'CTYPE2': 'DEC--TAN-SIP'})
+    True
+    >>> _is_celestial_header({'SIMPLE': True})
+    False
+    """
+    ctypes = (str(header.get('CTYPE1', ''))[:4], str(header.get('CTYPE2', ''))[:4])
+
+    if not any(ctypes):
+        return False
+
+    if ctypes in (('RA--', 'DEC-'), ('DEC-', 'RA--'),
+                  ('GLON', 'GLAT'), ('GLAT', 'GLON'),
+                  ('ELON', 'ELAT'), ('ELAT', 'ELON')):
+        return True
+
+    return WCS(header).is_celestial
+
+
+# Default options for solve-field, used along with `--guess-scale` and a `--cpulimit`.
+_DEFAULT_SOLVE_OPTS = (
+    '--no-verify',
+    '--crpix-center',
+    '--temp-axy',
+    '--index-xyls', 'none',
+    '--solved', 'none',
+    '--match', 'none',
+    '--rdls', 'none',
+    '--corr', 'none',
+    '--downsample', '4',
+    '--no-plots',
+)
+
+
 def solve_field(fname, timeout=15, solve_opts=None, *args, **kwargs):
     """ Plate solves an image.
 
@@ -168,30 +312,18 @@ def solve_field(fname, timeout=15, solve_opts=None, *args, **kwargs):
                                     defaults to 60 seconds.
         solve_opts(list, optional): List of options for solve-field.
     """
-    solve_field_script = shutil.which('solve-field')
+    solve_field_script = _which('solve-field')
 
     if solve_field_script is None:  # pragma: no cover
         raise error.InvalidSystemCommand("Can't find solve-field, is astrometry.net installed?")
 
     # Add the options for solving the field
     if solve_opts is not None:
-        options = solve_opts
+        # Copy so the kwargs below aren't added to the caller's list.
+        options = list(solve_opts)
     else:
         # Default options
-        options = [
-            '--guess-scale',
-            '--cpulimit', str(timeout),
-            '--no-verify',
-            '--crpix-center',
-            '--temp-axy',
-            '--index-xyls', 'none',
-            '--solved', 'none',
-            '--match', 'none',
-            '--rdls', 'none',
-            '--corr', 'none',
-            '--downsample', '4',
-            '--no-plots',
-        ]
+        options = ['--guess-scale', '--cpulimit', str(timeout), *_DEFAULT_SOLVE_OPTS]
 
         if 'ra' in kwargs:
             options.append('--ra')
@@ -214,10 +346,11 @@ def solve_field(fname, timeout=15, solve_opts=None, *args, **kwargs):
 
         return opt_string
 
+    present = frozenset(options)
     options.extend([_modify_opt(opt, val)
                     for opt, val
                     in kwargs.items()
-                    if opt.startswith('--') and opt not in options])
+                    if opt.startswith('--') and opt not in present])
 
     cmd = [solve_field_script] + options + [fname]
 
@@ -236,7 +369,9 @@ def solve_field(fname, timeout=15, solve_opts=None, *args, **kwargs):
 def get_solve_field(fname: Union[str, Path],
                     replace: bool = True,
                     overwrite: bool = True,
-                    timeout: float = 30, **kwargs) -> Dict:
+                    timeout: float = 30,
+                    hint_from: Optional[Union[str, Path, Tuple[float, float]]] = None,
+                    **kwargs) -> Dict:
     """Convenience function to wait for `solve_field` to finish.
 
     This function merely passes the `fname` of the image to be solved along to `solve_field`,
@@ -264,6 +399,11 @@ def get_solve_field(fname: Union[str, Path],
     >>> radius = 5 # deg
     >>> solve_info = fits_utils.solve_field(fits_fn, ra=ra, dec=dec, radius=radius)  # doctest: +SKIP
 
+    >>> # Start the search from the solution of a previous frame, e.g. when
+    >>> # solving the images of an observation in order.
+    >>> prev_fn = solve_info['solved_fits_file']  # doctest: +SKIP
+    >>> solve_info = fits_utils.get_solve_field(fits_fn, hint_from=prev_fn)  # doctest: +SKIP
+
     >>> # Pass kwargs to `solve-field` program.
     >>> solve_kwargs = {'--pnm': '/tmp/awesome.bmp'}
     >>> solve_info = fits_utils.get_solve_field(fits_fn, skip_solved=False, **solve_kwargs) # doctest: +SKIP
@@ -273,8 +413,12 @@ def get_solve_field(fname: Union[str, Path],
         fname ({str}): Name of FITS file to be solved.
         replace (bool, optional): Saves the WCS back to the original file,
             otherwise output base filename with `.new` extension. Default True.
+            The WCS is added directly to the header of compressed (`.fz`) files.
         overwrite (bool, optional): Clobber file, default True. Required if `replace=True`.
         timeout (int, optional): The timeout for solving, default 30 seconds.
+        hint_from (str or Path or tuple, optional): A solved FITS file or an (ra, dec)
+            tuple in degrees used as the starting position of the search if no `ra`
+            is given, see ~solve_hint. The search `radius` defaults to 3 degrees.
         **kwargs ({dict}): Options to pass to `solve_field` should start with `--`.
 
     Returns:
@@ -282,89 +426,245 @@ def get_solve_field(fname: Union[str, Path],
     """
     skip_solved = kwargs.get('skip_solved', True)
 
-    if isinstance(fname, Path):
-        fname = str(fname)
+    fname = os.fspath(fname)
 
     out_dict = {}
 
     header = getheader(fname)
-    wcs = WCS(header)
 
     # Check for solved file
-    if skip_solved and wcs.is_celestial:
+    if skip_solved and _is_celestial_header(header):
         logger.info(f"Skipping solved file (use skip_solved=False to solve again): {fname}")
 
         out_dict.update(header)
         out_dict['solved_fits_file'] = fname
         return out_dict
 
+    if hint_from is not None and 'ra' not in kwargs and '--ra' not in kwargs:
+        # Only fill in what the caller didn't give, in either form, as ~solve_field
+        # doesn't add a `--` option that is already present.
+        hint_ra, hint_dec = solve_hint(hint_from)
+        kwargs['ra'] = hint_ra
+        if 'dec' not in kwargs and '--dec' not in kwargs:
+            kwargs['dec'] = hint_dec
+        if 'radius' not in kwargs and '--radius' not in kwargs:
+            kwargs['radius'] = 3
+
     # Set a default radius of 15
     if overwrite:
         kwargs['--overwrite'] = True
 
     # Use unpacked version of file.
     was_compressed = False
-    if fname.endswith('.fz'):
-        logger.debug(f'Uncompressing {fname}')
-        fname = funpack(fname)
-        logger.debug(f'Using {fname} for solving')
-        was_compressed = True
-
-    logger.debug(f'Use solve arguments: {kwargs!r}')
-    proc = solve_field(fname, timeout=timeout, **kwargs)
+    tmp_dir = None
     try:
-        # Timeout plus a small buffer.
-        output, errs = proc.communicate(timeout=(timeout))
-    except subprocess.TimeoutExpired:
-        proc.kill()
-        output, errs = proc.communicate()
-        raise error.Timeout(f'Timeout while solving: {output!r} {errs!r}')
-    else:
-        if proc.returncode != 0:
-            logger.debug(f'Returncode: {proc.returncode}')
-        for log in [output, errs]:
-            if log and log > '':
-                logger.debug(f'Output on {fname}: {log}')
-
-        if proc.returncode == 3:
-            raise error.SolveError(f'solve-field not found: {output}')
-
-    new_fname = fname.replace('.fits', '.new')
-    if replace:
-        logger.debug(f'Overwriting original {fname}')
-        os.replace(new_fname, fname)
-    else:
-        fname = new_fname
+        if _is_fz(fname) and replace:
+            # Solve a temporary uncompressed copy and splice the WCS back into the
+            # compressed file below rather than writing a `.new` file and fpacking it.
+            fz_fname = fname
+            # The copy goes in its own directory so a FITS file next to the original
+            # is left alone.
+            tmp_dir = tempfile.mkdtemp()
+            fname = os.path.join(tmp_dir, os.path.basename(fz_fname)[:-len('.fz')])
+            logger.debug(f'Uncompressing {fz_fname} to {fname} for solving')
+            with fits.open(fz_fname) as hdul:
+                fits.writeto(fname, hdul[1].data, header=hdul[1].header, overwrite=True)
+            kwargs['--new-fits'] = 'none'
+            was_compressed = True
+        elif _is_fz(fname):
+            logger.debug(f'Uncompressing {fname}')
+            fname = funpack(fname)
+            logger.debug(f'Using {fname} for solving')
+
+        logger.debug(f'Use solve arguments: {kwargs!r}')
+        proc = solve_field(fname, timeout=timeout, **kwargs)
+        try:
+            # With a timeout `communicate` reads both pipes with a selector as the
+            # output arrives, so the solver never blocks on a full pipe. The output
+            # is a few kB at most so it isn't worth discarding outside of DEBUG.
+            # The exit is noticed when the pipes close, so no polling wait is involved.
+            output, errs = proc.communicate(timeout=(timeout))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            output, errs = proc.communicate()
+            raise error.Timeout(f'Timeout while solving: {output!r} {errs!r}')
+        else:
+            if proc.returncode != 0:
+                logger.debug(f'Returncode: {proc.returncode}')
+            for log in [output, errs]:
+                if log and log > '':
+                    logger.debug(f'Output on {fname}: {log}')
+
+            if proc.returncode == 3:
+                raise error.SolveError(f'solve-field not found: {output}')
+
+        wcs_fname = fname.replace('.fits', '.wcs')
+        if not os.path.exists(wcs_fname):
+            raise error.SolveError(f'File not solved, solve-field wrote no WCS for {fname}')
+
+        if was_compressed:
+            logger.debug(f'Adding WCS to {fz_fname}')
+            _update_wcs_header(fz_fname, wcs_fname)
+            fname = fz_fname
+        elif replace:
+            logger.debug(f'Overwriting original {fname}')
+            try:
+                os.replace(fname.replace('.fits', '.new'), fname)
+            except FileNotFoundError:
+                raise error.SolveError(
+                    f'File not solved, solve-field wrote no new file for {fname}')
+        else:
+            fname = fname.replace('.fits', '.new')
+
+        try:
+            # Drop the COMMENT and HISTORY cards in a single pass.
+            header = fits.Header([card
+                                  for card in getheader(fname).cards
+                                  if card.keyword not in ('COMMENT', 'HISTORY')])
+            out_dict.update(header)
+        except OSError:
+            logger.warning(f"Can't read fits header for: {fname}")
+
+        # Check it was solved.
+        if _is_celestial_header(header) is False:
+            raise error.SolveError('File not properly solved, no WCS header present.')
+
+        # Remove WCS file.
+        os.remove(wcs_fname)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    out_dict['solved_fits_file'] = fname
+
+    return out_dict
+
+
+# Cards in a `solve-field` `.wcs` file that describe the file rather than the solution.
+_WCS_FILE_SKIP_KEYWORDS = (
+    'SIMPLE', 'BITPIX', 'NAXIS', 'NAXIS1', 'NAXIS2', 'EXTEND', 'COMMENT', 'HISTORY', ''
+)
+
+
+def _update_wcs_header(fz_fname, wcs_fname):
+    """Add the WCS from a `solve-field` `.wcs` file to the image header of a compressed file.
+
+    Only the header is rewritten, the compressed data is left as is.
+    """
+    wcs_header = fits.getheader(wcs_fname)
+    with fits.open(fz_fname, mode='update') as hdul:
+        header = hdul[1].header
+        for card in wcs_header.cards:
+            if card.keyword not in _WCS_FILE_SKIP_KEYWORDS:
+                header.set(card.keyword, card.value, card.comment)
+
+    _getheader_cached.cache_clear()
+
 
+def _get_solve_field_or_none(fname, **kwargs):
+    """Call ~get_solve_field, logging the error and returning None if it can't solve."""
     try:
-        header = getheader(fname)
-        header.remove('COMMENT', ignore_missing=True, remove_all=True)
-        header.remove('HISTORY', ignore_missing=True, remove_all=True)
-        out_dict.update(header)
-    except OSError:
-        logger.warning(f"Can't read fits header for: {fname}")
+        return get_solve_field(fname, **kwargs)
+    except (error.PanError, OSError) as e:
+        logger.warning(f'Could not solve {fname}: {e!r}')
+        return None
 
-    # Check it was solved.
-    if WCS(header).is_celestial is False:
-        raise error.SolveError('File not properly solved, no WCS header present.')
 
-    # Remove WCS file.
-    os.remove(fname.replace('.fits', '.wcs'))
+def get_solve_field_batch(fits_fnames: List[Union[str, Path]],
+                          max_workers: Optional[int] = 4,
+                          **kwargs) -> List[Optional[Dict]]:
+    """Plate-solve a number of FITS files in parallel.
 
-    if was_compressed and replace:
-        logger.debug(f'Compressing plate-solved {fname}')
-        fname = fpack(fname)
+    Each file is solved with ~get_solve_field, with a `solve-field` process
+    per file running at once. Each solve loads the astrometry.net index files
+    so a small number of workers is used by default.
 
-    out_dict['solved_fits_file'] = fname
+    Args:
+        fits_fnames (list): The FITS files to solve.
+        max_workers (int, optional): The number of files to solve at once, default 4.
+        **kwargs: Passed to ~get_solve_field for each file.
 
-    return out_dict
+    Returns:
+        list: The solve information for each file in the same order as `fits_fnames`.
+            A `None` entry indicates that file could not be solved.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(partial(_get_solve_field_or_none, **kwargs), fits_fnames))
+
+
+def solve_hint(hint_from):
+    """Get a starting (ra, dec) position for `solve-field`.
+
+    Solving is much faster when the search is limited to the area around a
+    previous solution, e.g. for consecutive frames of an observation.
+
+    >>> from panoptes.utils.images import fits as fits_utils
+    >>> fits_utils.solve_hint((303.2, 46.0))
+    (303.2, 46.0)
+    >>> fits_fn = getfixture('solved_fits_file')
+    >>> fits_utils.solve_hint(fits_fn)
+    (303.206422334, 46.0173987483)
+
+    Args:
+        hint_from (str or Path or tuple): A plate-solved FITS file or an
+            (ra, dec) tuple in degrees.
+
+    Returns:
+        tuple(float, float): The ra and dec in degrees.
+    """
+    if isinstance(hint_from, (str, os.PathLike)):
+        header = getheader(hint_from)
+        return header['CRVAL1'], header['CRVAL2']
+
+    ra, dec = hint_from
+    return float(ra), float(dec)
+
+
+# Units for the `wcsinfo` output values, see ~get_wcsinfo_values.
+WCSINFO_UNITS = {
+    'crpix0': 'pix',
+    'crpix1': 'pix',
+    'crval0': 'deg',
+    'crval1': 'deg',
+    'cd11': 'deg / pix',
+    'cd12': 'deg / pix',
+    'cd21': 'deg / pix',
+    'cd22': 'deg / pix',
+    'imagew': 'pix',
+    'imageh': 'pix',
+    'pixscale': 'arcsec / pix',
+    'orientation': 'deg',
+    'ra_center': 'deg',
+    'dec_center': 'deg',
+    'orientation_center': 'deg',
+    'ra_center_h': 'hourangle',
+    'ra_center_m': 'min',
+    'ra_center_s': 's',
+    'dec_center_d': 'deg',
+    'dec_center_m': 'min',
+    'dec_center_s': 's',
+    'fieldarea': 'deg2',
+    'fieldw': 'deg',
+    'fieldh': 'deg',
+    'decmin': 'deg',
+    'decmax': 'deg',
+    'ramin': 'deg',
+    'ramax': 'deg',
+    'ra_min_merc': 'deg',
+    'ra_max_merc': 'deg',
+    'dec_min_merc': 'deg',
+    'dec_max_merc': 'deg',
+    'merc_diff': 'deg',
+}
+_WCSINFO_UNITS = {k: u.Unit(v) for k, v in WCSINFO_UNITS.items()}
 
 
 def get_wcsinfo(fits_fname, **kwargs):
     """Returns the WCS information for a FITS file.
 
     Uses the `wcsinfo` astrometry.net utility script to get the WCS information
-    from a plate-solved file.
+    from a plate-solved file. Values with a known unit are returned as an
+    `astropy.units.Quantity`, see ~get_wcsinfo_values for plain floats.
 
     Args:
         fits_fname ({str}): Name of a FITS file that contains a WCS.
@@ -376,82 +676,77 @@ def get_wcsinfo(fits_fname, **kwargs):
     Raises:
         error.InvalidCommand: Raised if `wcsinfo` is not found (part of astrometry.net)
     """
+    wcs_info = get_wcsinfo_values(fits_fname, **kwargs)
+
+    # Constructing the Quantity directly is about twice as fast as `value * unit`.
+    for k, unit in _WCSINFO_UNITS.items():
+        if k in wcs_info:
+            wcs_info[k] = u.Quantity(wcs_info[k], unit)
+
+    return wcs_info
+
+
+def get_wcsinfo_values(fits_fname, **kwargs):
+    """Returns the WCS information for a FITS file as plain floats.
+
+    This is the same as ~get_wcsinfo but without creating a `Quantity` for each
+    value. The units of the values are given by `WCSINFO_UNITS`.
+
+    Args:
+        fits_fname ({str}): Name of a FITS file that contains a WCS.
+        **kwargs: Args that can be passed to wcsinfo.
+
+    Returns:
+        dict: Output as returned from `wcsinfo`.
+
+    Raises:
+        error.InvalidCommand: Raised if `wcsinfo` is not found (part of astrometry.net)
+    """
+    fits_fname = os.fspath(fits_fname)
     assert os.path.exists(fits_fname), warn(f"No file exists at: {fits_fname}")
 
-    wcsinfo = shutil.which('wcsinfo')
+    wcsinfo = _which('wcsinfo')
     if wcsinfo is None:
         raise error.InvalidCommand('wcsinfo not found')
 
     run_cmd = [wcsinfo, fits_fname]
 
-    if fits_fname.endswith('.fz'):
+    if _is_fz(fits_fname):
         run_cmd.append('-e')
         run_cmd.append('1')
 
-    proc = subprocess.Popen(run_cmd, stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT, universal_newlines=True)
     try:
-        output, errs = proc.communicate(timeout=5)
+        output = subprocess.run(run_cmd, capture_output=True, text=True, timeout=5).stdout
     except subprocess.TimeoutExpired:  # pragma: no cover
-        proc.kill()
-        output, errs = proc.communicate()
-
-    unit_lookup = {
-        'crpix0': u.pixel,
-        'crpix1': u.pixel,
-        'crval0': u.degree,
-        'crval1': u.degree,
-        'cd11': (u.deg / u.pixel),
-        'cd12': (u.deg / u.pixel),
-        'cd21': (u.deg / u.pixel),
-        'cd22': (u.deg / u.pixel),
-        'imagew': u.pixel,
-        'imageh': u.pixel,
-        'pixscale': (u.arcsec / u.pixel),
-        'orientation': u.degree,
-        'ra_center': u.degree,
-        'dec_center': u.degree,
-        'orientation_center': u.degree,
-        'ra_center_h': u.hourangle,
-        'ra_center_m': u.minute,
-        'ra_center_s': u.second,
-        'dec_center_d': u.degree,
-        'dec_center_m': u.minute,
-        'dec_center_s': u.second,
-        'fieldarea': (u.degree * u.degree),
-        'fieldw': u.degree,
-        'fieldh': u.degree,
-        'decmin': u.degree,
-        'decmax': u.degree,
-        'ramin': u.degree,
-        'ramax': u.degree,
-        'ra_min_merc': u.degree,
-        'ra_max_merc': u.degree,
-        'dec_min_merc': u.degree,
-        'dec_max_merc': u.degree,
-        'merc_diff': u.degree,
-    }
+        logger.warning(f'Timeout running wcsinfo on {fits_fname}')
+        output = ''
 
     wcs_info = {}
-    for line in output.split('\n'):
+    # Each line is a key and a value, e.g. `ra_center 303.206`.
+    for line in output.splitlines():
+        k, sep, v = line.partition(' ')
+        if not sep:
+            continue
         try:
-            k, v = line.split(' ')
-            try:
-                v = float(v)
-            except Exception:
-                pass
-
-            wcs_info[k] = float(v) * unit_lookup.get(k, 1)
+            wcs_info[k] = float(v)
         except ValueError:
-            pass
-            # print("Error on line: {}".format(line))
+            # Skip non-numeric values.
+            continue
 
     wcs_info['wcs_file'] = fits_fname
 
     return wcs_info
 
 
-def fpack(fits_fname, unpack=False, overwrite=True):
+# `fpack` flags for the compression methods, see ~fpack.
+_FPACK_METHODS = {
+    'rice': '-r',
+    'gzip': '-g',
+    'hcompress': '-h',
+}
+
+
+def fpack(fits_fname, unpack=False, overwrite=True, tile=None, method='rice', quantize=None):
     """Compress/Decompress a FITS file
 
     Uses `fpack` (or `funpack` if `unpack=True`) to compress a FITS file
@@ -459,47 +754,91 @@ def fpack(fits_fname, unpack=False, overwrite=True):
     Args:
         fits_fname ({str}): Name of a FITS file that contains a WCS.
         unpack ({bool}, optional): file should decompressed instead of compressed, default False.
+        tile (tuple(int, int), optional): The size of the compression tiles in FITS
+            axis order, i.e. (NAXIS1, NAXIS2). Square tiles, e.g. `(100, 100)`, make
+            reading cutouts of the compressed file much faster. Default None uses the
+            `fpack` default of one row per tile.
+        method (str, optional): The compression method, one of 'rice' (the default),
+            'gzip' or 'hcompress'. Integer data is always compressed losslessly.
+        quantize (float, optional): The quantization level for floating point data,
+            passed as `fpack -q`. Higher values keep more precision and compress
+            less. Default None uses the `fpack` default of 4.
 
     Returns:
         str: Filename of compressed/decompressed file.
     """
+    fits_fname = os.fspath(fits_fname)
     assert os.path.exists(fits_fname), warn(
         "No file exists at: {}".format(fits_fname))
 
     if unpack:
-        fpack = shutil.which('funpack')
+        fpack = _which('funpack')
         run_cmd = [fpack, '-D', fits_fname]
         out_file = fits_fname.replace('.fz', '')
     else:
-        fpack = shutil.which('fpack')
-        run_cmd = [fpack, '-D', '-Y', fits_fname]
+        fpack = _which('fpack')
+        try:
+            method_flag = _FPACK_METHODS[method]
+        except KeyError:
+            raise ValueError(f'Unknown fpack method {method!r}, must be one of '
+                             f'{list(_FPACK_METHODS)}')
+
+        run_cmd = [fpack, '-D', '-Y']
+        if method != 'rice':
+            run_cmd.append(method_flag)
+        if tile is not None:
+            run_cmd.extend(['-t', '{},{}'.format(*tile)])
+        if quantize is not None:
+            run_cmd.extend(['-q', str(quantize)])
+        run_cmd.append(fits_fname)
         out_file = fits_fname.replace('.fits', '.fits.fz')
 
-    if os.path.exists(out_file):
-        if overwrite is False:
-            raise FileExistsError('Destination file already exists at location and overwrite=False')
-        else:
-            os.remove(out_file)
-
     try:
         assert fpack is not None
     except AssertionError:
         warn("fpack not found (try installing cfitsio). File has not been changed")
         return fits_fname
 
+    if overwrite:
+        with suppress(FileNotFoundError):
+            os.remove(out_file)
+    elif os.path.exists(out_file):
+        raise FileExistsError('Destination file already exists at location and overwrite=False')
+
     logger.debug("fpack command: {}".format(run_cmd))
 
-    proc = subprocess.Popen(run_cmd, stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT, universal_newlines=True)
     try:
-        output, errs = proc.communicate(timeout=5)
+        subprocess.run(run_cmd, capture_output=True, text=True, timeout=5)
     except subprocess.TimeoutExpired:
-        proc.kill()
-        output, errs = proc.communicate()
+        logger.warning(f'Timeout running {run_cmd!r}')
 
     return out_file
 
 
+def fpack_batch(fits_fnames: List[Union[str, Path]],
+                max_workers: Optional[int] = None,
+                **kwargs) -> List[str]:
+    """Compress/Decompress a number of FITS files in parallel.
+
+    Each file is compressed with ~fpack. The work is done by the `fpack`
+    processes so the files are handled from a thread pool, which keeps that
+    many `fpack` processes running at once.
+
+    Args:
+        fits_fnames (list): The FITS files to compress.
+        max_workers (int, optional): The number of files to compress at once,
+            default `None` which uses the number of processors on the machine.
+        **kwargs: Passed to ~fpack for each file.
+
+    Returns:
+        list: The compressed (or decompressed) filenames in the same order as
+            `fits_fnames`.
+    """
+    max_workers = max_workers or os.cpu_count()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(partial(fpack, **kwargs), fits_fnames))
+
+
 def funpack(*args, **kwargs):
     """Unpack a FITS file.
 
@@ -518,6 +857,10 @@ def funpack(*args, **kwargs):
     return fpack(*args, unpack=True, **kwargs)
 
 
+# Directories already created by ~write_fits.
+_MKDIR_CACHE = set()
+
+
 def write_fits(data, header, filename, exposure_event=None, **kwargs):
     """Write FITS file to requested location.
 
@@ -548,12 +891,31 @@ def write_fits(data, header, filename, exposure_event=None, **kwargs):
     hdu = fits.PrimaryHDU(data, header=header)
 
     # Create directories if required.
-    if os.path.dirname(filename):
-        os.makedirs(os.path.dirname(filename), mode=0o775, exist_ok=True)
+    dirname = os.path.dirname(filename)
+    if dirname and dirname not in _MKDIR_CACHE:
+        os.makedirs(dirname, mode=0o775, exist_ok=True)
+        _MKDIR_CACHE.add(dirname)
 
     try:
-        hdu.writeto(filename, **kwargs)
+        # Serialize in memory and write the file in one go, astropy otherwise makes
+        # many small writes which are very slow on network filesystems.
+        overwrite = kwargs.pop('overwrite', False)
+        buf = io.BytesIO()
+        hdu.writeto(buf, **kwargs)
+        mode = 'wb' if overwrite else 'xb'
+        try:
+            with open(filename, mode) as f:
+                f.write(buf.getbuffer())
+        except FileNotFoundError:
+            if not dirname:
+                raise
+            # The directory was removed since it was created, make it again.
+            os.makedirs(dirname, mode=0o775, exist_ok=True)
+            with open(filename, mode) as f:
+                f.write(buf.getbuffer())
+        _getheader_cached.cache_clear()
     except OSError as err:
+        _MKDIR_CACHE.discard(dirname)
         logger.error(f'Error writing image to {filename}: {err!r}')
     else:
         logger.debug(f'Image written to {filename}')
@@ -562,6 +924,30 @@ def write_fits(data, header, filename, exposure_event=None, **kwargs):
             exposure_event.set()
 
 
+# FITS keyword, `Observation.status` key, default value and comment for ~update_observation_headers.
+OBSERVATION_HEADERS = [
+    ('IMAGEID', 'image_id', '', None),
+    ('SEQID', 'sequence_id', '', None),
+    ('FIELD', 'field_name', '', None),
+    ('RA-MNT', 'ra_mnt', '', 'Degrees'),
+    ('HA-MNT', 'ha_mnt', '', 'Degrees'),
+    ('DEC-MNT', 'dec_mnt', '', 'Degrees'),
+    ('EQUINOX', 'equinox', 2000., None),  # Assume J2000
+    ('AIRMASS', 'airmass', '', 'Sec(z)'),
+    ('FILTER', 'filter', '', None),
+    ('LAT-OBS', 'latitude', '', 'Degrees'),
+    ('LONG-OBS', 'longitude', '', 'Degrees'),
+    ('ELEV-OBS', 'elevation', '', 'Meters'),
+    ('MOONSEP', 'moon_separation', '', 'Degrees'),
+    ('MOONFRAC', 'moon_fraction', '', None),
+    ('CREATOR', 'creator', '', 'POCS Software version'),
+    ('INSTRUME', 'camera_uid', '', 'Camera ID'),
+    ('OBSERVER', 'observer', '', 'PANOPTES Unit ID'),
+    ('ORIGIN', 'origin', '', None),
+    ('RA-RATE', 'tracking_rate_ra', '', 'RA Tracking Rate'),
+]
+
+
 def update_observation_headers(file_path, info):
     """Update FITS headers with items from the Observation status.
 
@@ -579,31 +965,38 @@ def update_observation_headers(file_path, info):
     'Tabbys Star'
 
     Args:
-        file_path (str): Path to a FITS file.
+        file_path (str): Path to a FITS file. If the file is compressed (`.fz`)
+            the headers are set on the image extension.
         info (dict): The return dict from `pocs.observatory.Observation.status`,
             which includes basic information about the observation.
     """
+    ext = 1 if _is_fz(os.fspath(file_path)) else 0
     with fits.open(file_path, 'update') as f:
-        hdu = f[0]
-        hdu.header.set('IMAGEID', info.get('image_id', ''))
-        hdu.header.set('SEQID', info.get('sequence_id', ''))
-        hdu.header.set('FIELD', info.get('field_name', ''))
-        hdu.header.set('RA-MNT', info.get('ra_mnt', ''), 'Degrees')
-        hdu.header.set('HA-MNT', info.get('ha_mnt', ''), 'Degrees')
-        hdu.header.set('DEC-MNT', info.get('dec_mnt', ''), 'Degrees')
-        hdu.header.set('EQUINOX', info.get('equinox', 2000.))  # Assume J2000
-        hdu.header.set('AIRMASS', info.get('airmass', ''), 'Sec(z)')
-        hdu.header.set('FILTER', info.get('filter', ''))
-        hdu.header.set('LAT-OBS', info.get('latitude', ''), 'Degrees')
-        hdu.header.set('LONG-OBS', info.get('longitude', ''), 'Degrees')
-        hdu.header.set('ELEV-OBS', info.get('elevation', ''), 'Meters')
-        hdu.header.set('MOONSEP', info.get('moon_separation', ''), 'Degrees')
-        hdu.header.set('MOONFRAC', info.get('moon_fraction', ''))
-        hdu.header.set('CREATOR', info.get('creator', ''), 'POCS Software version')
-        hdu.header.set('INSTRUME', info.get('camera_uid', ''), 'Camera ID')
-        hdu.header.set('OBSERVER', info.get('observer', ''), 'PANOPTES Unit ID')
-        hdu.header.set('ORIGIN', info.get('origin', ''))
-        hdu.header.set('RA-RATE', info.get('tracking_rate_ra', ''), 'RA Tracking Rate')
+        hdu = f[ext]
+        # The header is only written once, when the file is closed. Unlike
+        # `Header.update`, `set` keeps the existing comment if none is given.
+        for keyword, info_key, default, comment in OBSERVATION_HEADERS:
+            hdu.header.set(keyword, info.get(info_key, default), comment)
+
+    # The file may be modified within the resolution of its mtime.
+    _getheader_cached.cache_clear()
+
+
+def _parse_fits_dt(value: str) -> datetime:
+    """Parse a FITS date string, e.g. `DATE` or `DATE-OBS`.
+
+    These are ISO 8601 so try the fast `datetime.fromisoformat` before falling
+    back to the generic parser for anything it doesn't handle.
+
+    >>> _parse_fits_dt('2016-09-09T08:11:52.123')
+    datetime.datetime(2016, 9, 9, 8, 11, 52, 123000)
+    >>> _parse_fits_dt('2016-09-09T08:11:52.1')
+    datetime.datetime(2016, 9, 9, 8, 11, 52, 100000)
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parse_date(value)
 
 
 def extract_metadata(header: fits.Header) -> dict:
@@ -625,61 +1018,65 @@ def extract_metadata(header: fits.Header) -> dict:
         header (astropy.io.fits.Header): The Header object from a FITS file.
     """
     path_info = ObservationPathInfo.from_fits_header(header)
+    hget = header.get
 
     try:
+        exptime = float(hget('EXPTIME'))
+
         # Add a units doc if it doesn't exist.
         unit_info = dict(
-            name=header.get('OBSERVER'),
-            latitude=header.get('LAT-OBS'),
-            longitude=header.get('LONG-OBS'),
-            elevation=float(header.get('ELEV-OBS')),
+            name=hget('OBSERVER'),
+            latitude=hget('LAT-OBS'),
+            longitude=hget('LONG-OBS'),
+            elevation=float(hget('ELEV-OBS')),
         )
 
         sequence_info = dict(
             time=path_info.sequence_time.to_datetime(timezone=UTC),
-            exptime=float(header.get('EXPTIME')),
-            software_version=header.get('CREATOR', ''),
-            field_name=header.get('FIELD', ''),
-            iso=header.get('ISO'),
-            ra=header.get('CRVAL1'),
-            dec=header.get('CRVAL2'),
+            exptime=exptime,
+            software_version=hget('CREATOR', ''),
+            field_name=hget('FIELD', ''),
+            iso=hget('ISO'),
+            ra=hget('CRVAL1'),
+            dec=hget('CRVAL2'),
             camera_id=path_info.camera_id,
-            camera_serial_number=str(header.get('CAMSN')),
-            lens_serial_number=header.get('INTSN'),
+            camera_serial_number=str(hget('CAMSN')),
+            lens_serial_number=hget('INTSN'),
         )
 
-        measured_rggb = header.get('MEASRGGB', '0 0 0 0').split(' ')
+        measured_rggb = hget('MEASRGGB', '0 0 0 0').split(' ')
         if 'DATE' in header:
-            file_date = parse_date(header.get('DATE')).replace(tzinfo=UTC)
+            file_date = _parse_fits_dt(hget('DATE')).replace(tzinfo=UTC)
         else:
             file_date = path_info.image_time.to_datetime(timezone=UTC)
-        camera_date = parse_date(header.get('DATE-OBS', path_info.image_time)).replace(tzinfo=UTC)
+        camera_date = _parse_fits_dt(hget('DATE-OBS', path_info.image_time))
+        camera_date = camera_date.replace(tzinfo=UTC)
 
         image_info = dict(
-            airmass=header.get('AIRMASS'),
+            airmass=hget('AIRMASS'),
             camera=dict(
                 dateobs=camera_date,
-                blue_balance=float(header.get('BLUEBAL')),
-                circconf=float(header.get('CIRCCONF', '0.').split(' ')[0]),
-                colortemp=float(header.get('COLORTMP')),
-                measured_ev=float(header.get('MEASEV')),
-                measured_ev2=float(header.get('MEASEV2')),
+                blue_balance=float(hget('BLUEBAL')),
+                circconf=float(hget('CIRCCONF', '0.').split(' ')[0]),
+                colortemp=float(hget('COLORTMP')),
+                measured_ev=float(hget('MEASEV')),
+                measured_ev2=float(hget('MEASEV2')),
                 measured_r=float(measured_rggb[0]),
                 measured_g1=float(measured_rggb[1]),
                 measured_g2=float(measured_rggb[2]),
                 measured_b=float(measured_rggb[3]),
-                red_balance=float(header.get('REDBAL')),
-                temperature=float(header.get('CAMTEMP', 0).split(' ')[0]),
-                white_lvln=header.get('WHTLVLN'),
-                white_lvls=header.get('WHTLVLS'),
+                red_balance=float(hget('REDBAL')),
+                temperature=float(hget('CAMTEMP', 0).split(' ')[0]),
+                white_lvln=hget('WHTLVLN'),
+                white_lvls=hget('WHTLVLS'),
             ),
-            exptime=float(header.get('EXPTIME')),
+            exptime=exptime,
             file_creation_date=file_date,
-            moonfrac=float(header.get('MOONFRAC')),
-            moonsep=float(header.get('MOONSEP')),
-            mount_dec=header.get('DEC-MNT'),
-            mount_ha=header.get('HA-MNT'),
-            mount_ra=header.get('RA-MNT'),
+            moonfrac=float(hget('MOONFRAC')),
+            moonsep=float(hget('MOONSEP')),
+            mount_dec=hget('DEC-MNT'),
+            mount_ha=hget('HA-MNT'),
+            mount_ra=hget('RA-MNT'),
             time=path_info.image_time.to_datetime(timezone=UTC),
         )
 
@@ -696,7 +1093,7 @@ def extract_metadata(header: fits.Header) -> dict:
     return metadata
 
 
-def getdata(fn, *args, **kwargs):
+def getdata(fn, *args, section=None, **kwargs):
     """Get the FITS data.
 
     Small wrapper around `astropy.io.fits.getdata` to auto-determine
@@ -719,14 +1116,36 @@ def getdata(fn, *args, **kwargs):
     >>> h1['FIELD']
     'KIC 8462852'
 
+    >>> # Read a cutout, which only decompresses the tiles it overlaps.
+    >>> getdata(fits_fn, section=np.s_[:2, :3])
+    array([[2215, 2169, 2200],
+           [2123, 2191, 2133]], dtype=uint16)
+
     Args:
-        fn (str): Path to FITS file.
+        fn (str or Path): Path to FITS file.
         *args: Passed to `astropy.io.fits.getdata`.
+        section (tuple of slices, optional): Only read this part of the image
+            from the image extension, see `astropy.io.fits.ImageHDU.section`.
+            Only the `header` option is supported along with a section, passing
+            any other arguments raises a `TypeError`.
         **kwargs: Passed to `astropy.io.fits.getdata`.
 
     Returns:
         `np.ndarray`: The FITS data.
     """
+    if section is not None:
+        unsupported = [repr(arg) for arg in args] + [key for key in kwargs if key != 'header']
+        if unsupported:
+            raise TypeError(f'Unsupported arguments with section: {", ".join(unsupported)}')
+
+        with _open_fits(fn) as (hdul, ext):
+            hdu = hdul[ext]
+            data = hdu.section[section]
+            if kwargs.get('header', False):
+                return data, hdu.header.copy()
+
+        return data
+
     return fits.getdata(fn, *args, **kwargs)
 
 
@@ -753,17 +1172,35 @@ def getheader(fn, *args, **kwargs):
     >>> header['IMAGEID']
     'PAN001_XXXXXX_20160909T081152'
 
+    Note:
+        Headers are cached on the path, inode, size and modification and change
+        times of the file so repeated calls for an unchanged file don't read it
+        again. The change time is updated on any write, including edits made in
+        place by other programs that restore the modification time. A copy of
+        the cached header is returned so it can safely be modified.
+
     Args:
-        fn (str): Path to FITS file.
+        fn (str or Path): Path to FITS file.
         *args: Passed to `astropy.io.fits.getheader`.
         **kwargs: Passed to `astropy.io.fits.getheader`.
 
     Returns:
         `astropy.io.fits.header.Header`: The FITS header for the data.
     """
-    ext = 0
-    if fn.endswith('.fz'):
-        ext = 1
+    fn = os.fspath(fn)
+    ext = 1 if _is_fz(fn) else 0
+    return _getheader_cached(fn, ext, _stat_key(fn)).copy()
+
+
+def _stat_key(fn: str) -> Tuple[int, int, int, int]:
+    """The stat values of `fn` that identify its contents for ~_getheader_cached."""
+    stat = os.stat(fn)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+
+
+@lru_cache(maxsize=128)
+def _getheader_cached(fn, ext, stat_key):
+    """Read the FITS header, see ~getheader. `stat_key` is only part of the cache key."""
     return fits.getheader(fn, ext=ext)
 
 
@@ -783,7 +1220,7 @@ def getwcs(fn, *args, **kwargs):
     False
 
     Args:
-        fn (str): Path to FITS file.
+        fn (str or Path): Path to FITS file.
         *args: Passed to `astropy.io.fits.getheader`.
         **kwargs: Passed to `astropy.io.fits.getheader`.
 
@@ -805,18 +1242,78 @@ def getval(fn, *args, **kwargs):
     >>> getval(fits_fn, 'IMAGEID')
     'PAN001_XXXXXX_20160909T081152'
 
+    Note:
+        A plain keyword lookup in an uncompressed file scans the header cards
+        directly, see ~_scan_header_value. Otherwise it is served from the
+        header cache used by ~getheader, so reading several values from the
+        same file only reads the header once.
+
     Args:
-        fn (str): Path to FITS file.
+        fn (str or Path): Path to FITS file.
 
     Returns:
         str or float: Value from header (with no type conversion).
     """
-    ext = 0
-    if fn.endswith('.fz'):
-        ext = 1
+    fn = os.fspath(fn)
+    ext = 1 if _is_fz(fn) else 0
+    if len(args) == 1 and not kwargs:
+        if ext == 0:
+            value = _scan_header_value(fn, args[0])
+            if value is not None:
+                return value
+
+        return _getheader_cached(fn, ext, _stat_key(fn))[args[0]]
+
     return fits.getval(fn, *args, ext=ext, **kwargs)
 
 
+def _scan_header_value(fn, keyword):
+    """Get a value from the primary header by scanning the raw header cards.
+
+    This avoids building the full `Header`, which is much slower when reading
+    a single keyword from each of many files.
+
+    >>> fits_fn = getfixture('unsolved_fits_file')
+    >>> _scan_header_value(fits_fn, 'field')
+    'KIC 8462852'
+    >>> _scan_header_value(fits_fn, 'HISTORY') is None
+    True
+
+    Returns:
+        The value of the first card for the keyword or None if the value can't
+        be read this way (e.g. a commentary or `HIERARCH` card, a long string or
+        not a FITS file), in which case use `astropy.io.fits` instead.
+
+    Raises:
+        KeyError: If the keyword is not in the header.
+    """
+    keyword = keyword.upper()
+    if len(keyword) > 8 or keyword in ('', 'COMMENT', 'HISTORY', 'CONTINUE', 'END'):
+        return None
+
+    key = keyword.encode('ascii').ljust(8)
+    with open(fn, 'rb') as f:
+        block = f.read(2880)
+        if not block.startswith(b'SIMPLE  '):
+            return None
+
+        while len(block) == 2880:
+            for i in range(0, 2880, 80):
+                card_key = block[i:i + 8]
+                if card_key == key:
+                    card = fits.Card.fromstring(block[i:i + 80].decode('ascii'))
+                    value = card.value
+                    # Long strings continue on the following cards.
+                    if isinstance(value, str) and value.endswith('&'):
+                        return None
+                    return value
+                elif card_key == b'END     ':
+                    raise KeyError(f"Keyword {keyword!r} not found.")
+            block = f.read(2880)
+
+    return None
+
+
 def fits_to_jpg(fname=None,
                 title=None,
                 figsize=(10, 10 / 1.325),
@@ -824,10 +1321,23 @@ def fits_to_jpg(fname=None,
                 alpha=0.2,
                 number_ticks=7,
                 clip_percent=99.9,
+                fig=None,
                 **kwargs):
-    data = mask_saturated(getdata(fname))
-    header = getheader(fname)
-    wcs = WCS(header)
+    """Make a jpg of a FITS image with a colorbar and coordinate grid.
+
+    Args:
+        fname (str): Path to the FITS file.
+        fig (`matplotlib.figure.Figure`, optional): A figure to draw on, which is
+            cleared first. Pass the same figure when making many images to avoid
+            creating a new one each time. Default None creates a new figure.
+
+    Returns:
+        str: Path to the jpg, which is `fname` with a `.jpg` extension.
+    """
+    with _open_fits(fname) as (hdul, ext):
+        hdu = hdul[ext]
+        header = hdu.header.copy()
+        data = mask_saturated(hdu.data, dtype=np.float32)
 
     if not title:
         field = header.get('FIELD', 'Unknown field')
@@ -845,15 +1355,26 @@ def fits_to_jpg(fname=None,
 
         title = f'{field} ({exptime}s {filter_type}) {date_time}'
 
-    norm = ImageNormalize(interval=PercentileInterval(clip_percent), stretch=LogStretch())
-
-    fig = Figure()
-    FigureCanvas(fig)
+    # The display limits don't need an exact percentile so use a subsample of
+    # large frames. An odd step samples all the Bayer channels.
+    step = 3 if data.size > 1_000_000 else 1
+    sample = np.asarray(data)[::step, ::step]
+    sample = sample[np.isfinite(sample)]
+    lower_percent = (100 - clip_percent) / 2
+    vmin, vmax = np.percentile(sample, (lower_percent, 100 - lower_percent))
+    norm = ImageNormalize(interval=ManualInterval(vmin, vmax), stretch=LogStretch())
+
+    reuse_fig = fig is not None
+    if reuse_fig:
+        fig.clf()
+    else:
+        fig = Figure()
+        FigureCanvas(fig)
     fig.set_size_inches(*figsize)
     fig.dpi = dpi
 
-    if wcs.is_celestial:
-        ax = fig.add_subplot(1, 1, 1, projection=wcs)
+    if _is_celestial_header(header):
+        ax = fig.add_subplot(1, 1, 1, projection=WCS(header))
         ax.coords.grid(True, color='white', ls='-', alpha=alpha)
 
         ra_axis = ax.coords['ra']
@@ -878,11 +1399,17 @@ def fits_to_jpg(fname=None,
     add_colorbar(im)
     fig.suptitle(title)
 
-    new_filename = re.sub(r'.fits(.fz)?', '.jpg', fname)
+    base = os.fspath(fname)
+    if _is_fz(base):
+        base = base[:-len('.fz')]
+    if base.endswith('.fits'):
+        base = base[:-len('.fits')]
+    new_filename = f'{base}.jpg'
     fig.savefig(new_filename, bbox_inches='tight')
 
     # explicitly close and delete figure
-    fig.clf()
-    del fig
+    if not reuse_fig:
+        fig.clf()
+        del fig
 
     return new_filename
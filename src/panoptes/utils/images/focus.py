@@ -42,18 +42,37 @@ def vollath_F4(data, axis=None):
     Returns:
         float64: Calculated F4 value for y, x axis or both
     """
-    # This calculation is prone to integer overflow if data is an integer type
-    # so convert to float64 before doing anything else.
-    data = data.astype(np.float64)
+    # Masked values are excluded from the means, so zero them for the sums and
+    # count the pairs where both values are valid.
+    if np.ma.is_masked(data):
+        valid = ~np.ma.getmaskarray(data)
+        data = np.ma.filled(data, 0)
+    else:
+        valid = None
+        data = np.ma.getdata(data)
+
+    def _mean_product(index0, index1):
+        # Sum the products in a single pass without creating the product array.
+        # This is prone to integer overflow if data is an integer type so
+        # accumulate in float64. Each sum already streams the data once, so a
+        # compiled (e.g. numba or Cython) kernel fusing all four would save
+        # little and would add a heavy dependency. Summing in cache-sized row
+        # strips was also tried and made no measurable difference.
+        total = np.einsum('ij,ij->', data[index0], data[index1], dtype=np.float64)
+        if valid is None:
+            count = data[index0].size
+        else:
+            count = np.count_nonzero(valid[index0] & valid[index1])
+        return total / count
 
     def _vollath_F4_y():
-        A1 = (data[1:] * data[:-1]).mean()
-        A2 = (data[2:] * data[:-2]).mean()
+        A1 = _mean_product(np.s_[1:], np.s_[:-1])
+        A2 = _mean_product(np.s_[2:], np.s_[:-2])
         return A1 - A2
 
     def _vollath_F4_x():
-        A1 = (data[:, 1:] * data[:, :-1]).mean()
-        A2 = (data[:, 2:] * data[:, :-2]).mean()
+        A1 = _mean_product(np.s_[:, 1:], np.s_[:, :-1])
+        A2 = _mean_product(np.s_[:, 2:], np.s_[:, :-2])
         return A1 - A2
 
     if str(axis).lower() == 'y':
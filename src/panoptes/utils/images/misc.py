@@ -1,11 +1,19 @@
+import glob
 import os
 import shutil
 import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import suppress
+from functools import lru_cache, partial
+from pathlib import PurePath
 
 import numpy as np
+from PIL import Image
 from astropy import units as u
+from astropy.io import fits
 from astropy.nddata import Cutout2D
+from astropy.nddata.utils import overlap_slices
 from loguru import logger
 
 from panoptes.utils import error
@@ -17,11 +25,19 @@ def make_timelapse(
         glob_pattern='20[1-9][0-9]*T[0-9]*.jpg',
         overwrite=False,
         timeout=60,
+        threads=None,
+        prefer_thumbnails=False,
+        thumbnail_workers=None,
         **kwargs):  # pragma: no cover
     """Create a timelapse.
 
     A timelapse is created from all the images in given ``directory``
 
+    Note:
+        ffmpeg already reads, decodes, scales and encodes the frames in its own
+        pipeline of threads. To make many timelapses use ~make_timelapses, which
+        runs several at once.
+
     Args:
         directory (str): Directory containing image files.
         fn_out (str, optional): Full path to output file name, if not provided,
@@ -32,6 +48,16 @@ def make_timelapse(
             to the local directory.
         overwrite (bool, optional): Overwrite timelapse if exists, default False.
         timeout (int): Timeout for making movie, default 60 seconds.
+        threads (int, optional): The number of threads for the encoder, default None
+            lets ffmpeg decide.
+        prefer_thumbnails (bool, optional): If True, make the movie from the images
+            in a ``thumbnails`` subdirectory of `directory` if there is one for each
+            image, otherwise from temporary copies of the images scaled down to 1080p
+            first, which is much faster than having ffmpeg scale the full-size images.
+            Default False.
+        thumbnail_workers (int, optional): The number of processes used to scale the
+            images if `prefer_thumbnails` is True, default None uses the number of
+            processors on the machine.
         **kwargs (dict):
 
     Returns:
@@ -42,12 +68,8 @@ def make_timelapse(
         FileExistsError: Raised if fn_out already exists and overwrite=False.
     """
     if fn_out is None:
-        head, tail = os.path.split(directory)
-        if tail == '':
-            head, tail = os.path.split(head)
-
-        field_name = head.split('/')[-2]
-        cam_name = head.split('/')[-1]
+        # PurePath drops any trailing separator and splits on the platform's own.
+        *_, field_name, cam_name, tail = PurePath(directory).parts
         fname = f'{field_name}_{cam_name}_{tail}.mp4'
         fn_out = os.path.normpath(os.path.join(directory, fname))
 
@@ -58,11 +80,30 @@ def make_timelapse(
     if ffmpeg is None:
         raise error.InvalidSystemCommand("ffmpeg not found, can't make timelapse")
 
-    inputs_glob = os.path.join(directory, glob_pattern)
-
+    tmp_dir = None
     try:
+        frames_dir = directory
+        if prefer_thumbnails:
+            frames = glob.glob(os.path.join(directory, glob_pattern))
+            thumbnails_dir = os.path.join(directory, 'thumbnails')
+            thumbnails = glob.glob(os.path.join(thumbnails_dir, glob_pattern))
+            # Only use existing thumbnails if there is one for each of the frames.
+            if thumbnails and ({os.path.basename(fn) for fn in thumbnails} ==
+                               {os.path.basename(fn) for fn in frames}):
+                frames_dir = thumbnails_dir
+            else:
+                tmp_dir = tempfile.mkdtemp()
+                frames_dir = _make_thumbnails(frames, tmp_dir, max_workers=thumbnail_workers)
+
+        # ffmpeg reads the images itself, piping them from Python wouldn't save any
+        # reads as each file has to be opened either way.
+        inputs_glob = os.path.join(frames_dir, glob_pattern)
+
         ffmpeg_cmd = [
             ffmpeg,
+            '-nostdin',
+            # Only errors are logged so there is little to read back from the pipe.
+            '-loglevel', 'error',
             '-r', '3',
             '-pattern_type', 'glob',
             '-i', inputs_glob,
@@ -70,6 +111,9 @@ def make_timelapse(
             '-vcodec', 'libx264',
         ]
 
+        if threads:
+            ffmpeg_cmd.extend(['-threads', str(threads)])
+
         if overwrite:
             ffmpeg_cmd.append('-y')
 
@@ -77,27 +121,91 @@ def make_timelapse(
 
         logger.debug(ffmpeg_cmd)
 
-        proc = subprocess.Popen(ffmpeg_cmd, universal_newlines=True,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # ffmpeg writes nothing to stdout and only its log to stderr.
+        proc = subprocess.Popen(ffmpeg_cmd,
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE)
         try:
             # Don't wait forever
-            outs, errs = proc.communicate(timeout=timeout)
+            _, errs = proc.communicate(timeout=timeout)
         except subprocess.TimeoutExpired:
             proc.kill()
-            outs, errs = proc.communicate()
+            _, errs = proc.communicate()
         finally:
-            logger.debug(f"Output: {outs}")
-            logger.debug(f"Errors: {errs}")
+            logger.debug(f"Errors: {errs.decode(errors='replace')}")
 
             # Double-check for file existence
             if not os.path.exists(fn_out):
                 fn_out = None
     except Exception as e:
         raise error.PanError(f"Problem creating timelapse in {fn_out}: {e!r}")
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
     return fn_out
 
 
+def _make_thumbnail(fname, out_dir, size=(1920, 1080)):
+    """Save a copy of the image scaled down to fit within `size` in `out_dir`."""
+    out_fname = os.path.join(out_dir, os.path.basename(fname))
+    with Image.open(fname) as img:
+        # Have the JPEG decoder do most of the scaling while reading the image.
+        img.draft('RGB', size)
+        img.thumbnail(size)
+        # Keep the quality high as the frames are encoded again by ffmpeg.
+        img.save(out_fname, quality=95)
+
+    return out_fname
+
+
+def _make_thumbnails(fnames, out_dir, size=(1920, 1080), max_workers=None):
+    """Scale down all the images in parallel with ~_make_thumbnail, returning `out_dir`."""
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(partial(_make_thumbnail, out_dir=out_dir, size=size), fnames))
+
+    return out_dir
+
+
+def _make_timelapse_or_none(directory, **kwargs):  # pragma: no cover
+    """Call ~make_timelapse, logging the error and returning None if it fails."""
+    try:
+        return make_timelapse(directory, **kwargs)
+    except (error.PanError, FileExistsError) as e:
+        logger.warning(f'Could not make timelapse for {directory}: {e!r}')
+        return None
+
+
+def make_timelapses(directories, max_workers=None, **kwargs):  # pragma: no cover
+    """Create a timelapse for each of a number of directories in parallel.
+
+    Each timelapse is made with ~make_timelapse, with an ffmpeg process per
+    directory running at once. Unless `threads` and `thumbnail_workers` are given
+    the encoder threads and the processes for scaling the images are split between
+    the timelapses so the machine isn't oversubscribed.
+
+    Args:
+        directories (list): The directories containing the image files.
+        max_workers (int, optional): The number of timelapses to make at once,
+            default None which uses the number of processors on the machine.
+        **kwargs: Passed to ~make_timelapse for each directory. Note that `fn_out`
+            should not be passed as each timelapse is named after its directory.
+
+    Returns:
+        list: The timelapse filenames in the same order as `directories`. A `None`
+            entry indicates the timelapse could not be made.
+    """
+    cpu_count = os.cpu_count() or 1
+    max_workers = max_workers or cpu_count
+    kwargs.setdefault('threads', max(1, cpu_count // max_workers))
+    # Split the processes for scaling the images the same way.
+    kwargs.setdefault('thumbnail_workers', max(1, cpu_count // max_workers))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(partial(_make_timelapse_or_none, **kwargs), directories))
+
+
 def crop_data(data, box_width=200, center=None, data_only=True, wcs=None, **kwargs):
     """Return a cropped portion of the image.
 
@@ -123,8 +231,13 @@ def crop_data(data, box_width=200, center=None, data_only=True, wcs=None, **kwar
         >>> plt.show()
 
 
+    The data can also be a FITS image HDU or the path to a FITS file, in which
+    case only the cropped part of the image is read, and for compressed files
+    only the tiles that overlap it are decompressed. Note that the full image is
+    still read if `data_only=False`.
+
     Args:
-        data (`numpy.array`): Array of data.
+        data (`numpy.array`): Array of data, a FITS image HDU or a path to a FITS file.
         box_width (int, optional): Size of box width in pixels, defaults to 200px.
         center (tuple(int, int), optional): Crop around set of coords, default to image center.
         data_only (bool, optional): If True (default), return only data. If False
@@ -137,8 +250,22 @@ def crop_data(data, box_width=200, center=None, data_only=True, wcs=None, **kwar
             a `astropy.nddata.Cutout2D` object.
 
     """
-    assert data.shape[
-               0] >= box_width, f"Can't clip data, it's smaller than {box_width} ({data.shape})"
+    if isinstance(data, (str, os.PathLike)):
+        fits_fname = os.fspath(data)
+        with fits.open(fits_fname, lazy_load_hdus=True) as hdul:
+            hdu = hdul[1 if fits_fname.endswith('.fz') else 0]
+            return crop_data(hdu, box_width=box_width, center=center, data_only=data_only,
+                             wcs=wcs, **kwargs)
+
+    section = getattr(data, 'section', None)
+    if section is not None and not data_only:
+        # The Cutout2D needs the full array.
+        data = data.data
+
+    height, width = data.shape[:2]
+    if box_width > height or box_width > width:
+        raise ValueError(f"Can't clip data, it's smaller than {box_width} ({data.shape})")
+
     # Get the center
     if center is None:
         x_len, y_len = data.shape
@@ -151,15 +278,84 @@ def crop_data(data, box_width=200, center=None, data_only=True, wcs=None, **kwar
     logger.debug(f"Using center: {x_center} {y_center}")
     logger.debug(f"Box width: {box_width}")
 
-    cutout = Cutout2D(data, (y_center, x_center), box_width, wcs=wcs)
-
     if data_only:
-        return cutout.data
+        # Slice the same pixels Cutout2D would select without creating the object.
+        x0 = x_center - box_width // 2
+        y0 = y_center - box_width // 2
+        x1 = x0 + box_width
+        y1 = y0 + box_width
+        if 0 <= x0 and 0 <= y0 and x1 <= height and y1 <= width:
+            large_slices = (slice(x0, x1), slice(y0, y1))
+        else:
+            # The box runs over the edge so let astropy trim it.
+            large_slices, _ = overlap_slices(data.shape, (box_width, box_width),
+                                             (x_center, y_center), mode='trim')
+        if section is not None:
+            return section[large_slices]
+
+        return data[large_slices]
+
+    return Cutout2D(data, (y_center, x_center), box_width, wcs=wcs)
+
+
+def crop_data_batch(data, centers, box_width=200):
+    """Return a stack of cropped portions of the image.
+
+    This gives the same cutouts as calling ~crop_data for each center but
+    copies all of them into a single array in one vectorized step, which is
+    much faster when making many small cutouts, e.g. for a catalog of sources.
 
-    return cutout
+    >>> data = np.arange(100).reshape(10, 10)
+    >>> stack = crop_data_batch(data, [(2, 3), (6, 6)], box_width=3)
+    >>> stack.shape
+    (2, 3, 3)
+    >>> stack[0]
+    array([[21, 22, 23],
+           [31, 32, 33],
+           [41, 42, 43]])
 
+    Args:
+        data (`numpy.array`): Array of data.
+        centers (array_like): The (x, y) centers of the cutouts, as for ~crop_data.
+        box_width (int, optional): Size of box width in pixels, defaults to 200px.
+
+    Returns:
+        np.array: The cutouts with a shape of (len(centers), box_width, box_width).
 
-def mask_saturated(data, saturation_level=None, threshold=0.9, bit_depth=None, dtype=None):
+    Raises:
+        ValueError: If any of the cutouts is not fully inside the data.
+    """
+    data = np.asarray(data)
+    centers = np.asarray(centers, dtype=int).reshape(-1, 2)
+
+    # The same start pixels as `Cutout2D`, see `astropy.nddata.utils.overlap_slices`.
+    rows = np.ceil(centers[:, 1] - box_width / 2).astype(int)
+    cols = np.ceil(centers[:, 0] - box_width / 2).astype(int)
+
+    max_row = data.shape[0] - box_width
+    max_col = data.shape[1] - box_width
+    outside = (rows < 0) | (rows > max_row) | (cols < 0) | (cols > max_col)
+    if outside.any():
+        raise ValueError(f"Cutouts are not fully inside the data: {centers[outside].tolist()}")
+
+    # A read-only view of every box_width window, indexed by its first pixel.
+    windows = np.lib.stride_tricks.as_strided(data,
+                                              shape=(max_row + 1, max_col + 1,
+                                                     box_width, box_width),
+                                              strides=data.strides * 2,
+                                              writeable=False)
+
+    return windows[rows, cols]
+
+
+def mask_saturated(data,
+                   saturation_level=None,
+                   threshold=0.9,
+                   bit_depth=None,
+                   dtype=None,
+                   return_mask=False,
+                   clip=False,
+                   out=None):
     """Convert data to a masked array with saturated values masked.
 
     .. plot::
@@ -196,9 +392,21 @@ def mask_saturated(data, saturation_level=None, threshold=0.9, bit_depth=None, d
             cannot be inferred and an IllegalValue exception will be raised.
         dtype (numpy.dtype, optional): The requested dtype for the masked array. If not given
             the dtype of the masked array will be same as data.
+        return_mask (bool, optional): If True return the data as a plain array and the
+            saturation mask separately rather than as a masked array, default False.
+            This avoids the `numpy.ma` overhead for code that handles the mask itself, see
+            ~mask_saturated_arrays.
+        clip (bool, optional): If True return a plain array with the saturated values
+            set to the saturation level instead of masked, default False. This can be
+            combined with `return_mask`.
+        out (tuple, optional): A tuple of (data, mask) arrays of the same shape as the
+            data to write the results into, either of which can be None. When processing
+            many frames of the same size this reuses the memory instead of allocating
+            new arrays for each frame. The `dtype` of the data buffer is used.
 
     Returns:
-        numpy.ma.array: The masked numpy array.
+        numpy.ma.array: The masked numpy array. If `return_mask` is True a tuple of the
+            data array and the boolean mask. If `clip` is True the clipped data array.
 
     Raises:
         error.IllegalValue: Raised if bit_depth is an astropy.units.Quantity object but the
@@ -206,21 +414,68 @@ def mask_saturated(data, saturation_level=None, threshold=0.9, bit_depth=None, d
         error.IllegalValue: Raised if neither saturation level or bit_depth are given, and data
             has a non integer data type.
     """
+    data, mask = mask_saturated_arrays(data,
+                                       saturation_level=saturation_level,
+                                       threshold=threshold,
+                                       bit_depth=bit_depth,
+                                       dtype=dtype,
+                                       clip=clip,
+                                       out=out)
+
+    if return_mask:
+        return data, mask
+    elif clip:
+        return data
+
+    # The mask is kept as a full array even if nothing is saturated so that it
+    # can always be indexed like the data.
+    return np.ma.array(data, mask=mask, copy=False)
+
+
+def mask_saturated_arrays(data,
+                          saturation_level=None,
+                          threshold=0.9,
+                          bit_depth=None,
+                          dtype=None,
+                          clip=False,
+                          out=None):
+    """Return the data and a boolean mask of the saturated values as plain arrays.
+
+    This does the work for ~mask_saturated but never creates a `numpy.ma` masked
+    array, which numba and other compiled code can't handle. Analysis loops that
+    should be jit-compiled, e.g. for background estimation or centroiding, can use
+    the two arrays directly.
+
+    >>> data = np.array([[1, 2], [250, 3]], dtype=np.uint8)
+    >>> data, mask = mask_saturated_arrays(data)
+    >>> mask
+    array([[False, False],
+           [ True, False]])
+
+    Args:
+        data (array_like): The numpy data array. If it is a masked array its mask
+            is merged into the returned mask.
+        saturation_level (scalar, optional): The saturation level, see ~mask_saturated.
+        threshold (float, optional): The fraction of the maximum pixel value to use as
+            the saturation level, default 0.9.
+        bit_depth (astropy.units.Quantity or int, optional): The effective bit depth of
+            the data, see ~mask_saturated.
+        dtype (numpy.dtype, optional): The requested dtype for the data.
+        clip (bool, optional): If True set the saturated values to the saturation
+            level, default False.
+        out (tuple, optional): A tuple of (data, mask) arrays to write the results
+            into, see ~mask_saturated.
+
+    Returns:
+        tuple(numpy.ndarray, numpy.ndarray): The data and the boolean mask.
+
+    Raises:
+        error.IllegalValue: Raised if the saturation level can't be determined, see
+            ~mask_saturated.
+    """
     if not saturation_level:
         if bit_depth is not None:
-            try:
-                with suppress(AttributeError):
-                    bit_depth = bit_depth.to_value(unit=u.bit)
-            except u.UnitConversionError:
-                try:
-                    bit_depth = bit_depth.to_value(unit=u.bit / u.pixel)
-                except u.UnitConversionError:
-                    raise error.IllegalValue("bit_depth must have units of bits or bits/pixel, " +
-                                             f"got {bit_depth!r}")
-
-            bit_depth = int(bit_depth)
-            logger.trace(f"Using bit depth {bit_depth!r}")
-            saturation_level = threshold * (2 ** bit_depth - 1)
+            saturation_level = _sat_level(bit_depth, threshold)
         else:
             # No bit depth specified, try to guess.
             logger.trace(f"Inferring bit_depth from data type, {data.dtype!r}")
@@ -233,5 +488,70 @@ def mask_saturated(data, saturation_level=None, threshold=0.9, bit_depth=None, d
                                          "is not an integer type. Cannot determine correct " +
                                          "saturation level.")
     logger.debug(f"Masking image using saturation level {saturation_level!r}")
-    # Convert data to masked array of requested dtype, mask values above saturation level.
-    return np.ma.array(data, mask=(data > saturation_level), dtype=dtype)
+    # Comparing against a level of the data type keeps the mask a single SIMD
+    # pass over the data, see ~_data_threshold.
+    level = _data_threshold(data, saturation_level)
+
+    data_buf, mask_buf = (None, None) if out is None else out
+
+    # Mask values above saturation level, keeping any existing mask.
+    existing_mask = np.ma.getmaskarray(data) if np.ma.isMaskedArray(data) else None
+    data = np.ma.getdata(data)
+    mask = np.greater(data, level, out=mask_buf)
+    if existing_mask is not None:
+        mask |= existing_mask
+
+    # Convert data to the requested dtype, clipping in the same pass if requested.
+    if data_buf is None:
+        data = np.asarray(data, dtype=dtype)
+        if clip:
+            data = np.minimum(data, level, dtype=data.dtype)
+    else:
+        if clip:
+            np.minimum(data, level, out=data_buf, casting='unsafe')
+        else:
+            np.copyto(data_buf, data, casting='unsafe')
+        data = data_buf
+
+    return data, mask
+
+
+@lru_cache(maxsize=32)
+def _sat_level(bit_depth, threshold):
+    """Return the saturation level for the bit depth, see ~mask_saturated.
+
+    The unit conversion is slow compared to the masking of a small image, so the
+    level is cached as it is the same for every frame from a camera.
+    """
+    try:
+        with suppress(AttributeError):
+            bit_depth = bit_depth.to_value(unit=u.bit)
+    except u.UnitConversionError:
+        try:
+            bit_depth = bit_depth.to_value(unit=u.bit / u.pixel)
+        except u.UnitConversionError:
+            raise error.IllegalValue("bit_depth must have units of bits or bits/pixel, " +
+                                     f"got {bit_depth!r}")
+
+    bit_depth = int(bit_depth)
+    logger.trace(f"Using bit depth {bit_depth!r}")
+    return threshold * (2 ** bit_depth - 1)
+
+
+def _data_threshold(data, level):
+    """Return `level` as a scalar of the same type as the integer `data`.
+
+    For integer values `x > level` is the same as `x > floor(level)`, so comparing
+    against an integer of the data type gives the same mask without NumPy casting
+    every pixel to float for the comparison. Anything else is returned unchanged.
+    """
+    dtype = getattr(data, 'dtype', None)
+    if dtype is None or not np.issubdtype(dtype, np.integer) or not np.isscalar(level):
+        return level
+
+    info = np.iinfo(dtype)
+    level = np.floor(level)
+    if not info.min <= level < info.max:
+        return level
+
+    return dtype.type(level)
@@ -1,5 +1,7 @@
 import ctypes
 import ctypes.util
+import sys
+from functools import lru_cache
 
 from astropy.utils import resolve_name
 from loguru import logger
@@ -20,6 +22,10 @@ def load_c_library(name, path=None, mode=ctypes.DEFAULT_MODE, **kwargs):
             details. Should be one of ctypes.RTLD_GLOBAL, ctypes.RTLD_LOCAL, or
             ctypes.DEFAULT_MODE. Default is ctypes.DEFAULT_MODE.
 
+    Note:
+        The library is only looked up and loaded once for each combination of
+        arguments, later calls return the same `ctypes.CDLL`.
+
     Returns:
         ctypes.CDLL
 
@@ -31,9 +37,17 @@ def load_c_library(name, path=None, mode=ctypes.DEFAULT_MODE, **kwargs):
     if mode is None:
         # Interpret a value of None as the default.
         mode = ctypes.DEFAULT_MODE
+
+    return _load_c_library(name, path, mode)
+
+
+@lru_cache(maxsize=None)
+def _load_c_library(name, path, mode):
+    """Find and load the library, see ~load_c_library. Errors are not cached."""
     # Open library
     logger.debug(f"Opening {name} library")
     if not path:
+        # This can run external tools (e.g. `ldconfig`) so is slow.
         path = ctypes.util.find_library(name)
         if not path:
             raise error.NotFound(f"Cound not find {name} library!")
@@ -60,6 +74,17 @@ def load_module(module_name):
     Raises:
         error.NotFound: If module cannot be imported.
     """
+    return _load_module(module_name)
+
+
+@lru_cache(maxsize=None)
+def _load_module(module_name):
+    """Import the module, see ~load_module. Errors are not cached."""
+    # Already imported modules don't need resolving.
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+
     try:
         module = resolve_name(module_name)
     except ImportError:
@@ -1,14 +1,13 @@
-import operator
 import time
 from contextlib import suppress
 
 import serial
 from deprecated import deprecated
 from loguru import logger
-from serial.tools.list_ports import comports as get_comports
 
 from panoptes.utils import error
 from panoptes.utils import serializers
+from panoptes.utils.serial.device import _PORT_CACHE, _get_ports_by_vidpid, _get_ports_cached
 
 
 @deprecated(reason='Use panoptes.utils.serial.device')
@@ -18,7 +17,7 @@ def get_serial_port_info():
     Returns: a list of PySerial's ListPortInfo objects. See:
         https://github.com/pyserial/pyserial/blob/master/serial/tools/list_ports_common.py
     """
-    return sorted(get_comports(), key=operator.attrgetter('device'))
+    return list(_get_ports_cached(include_links=False))
 
 
 @deprecated(reason='Use panoptes.utils.serial.device')
@@ -47,9 +46,9 @@ def find_serial_port(vendor_id, product_id, return_all=False):  # pragma: no cov
     Returns:
         str or list: Either the path to the detected port or a list of all comports that match.
     """
-    # Get all serial ports.
-    matched_ports = [p for p in get_serial_port_info() if
-                     p.vid == vendor_id and p.pid == product_id]
+    # Look up the matching serial ports.
+    ports_by_vidpid = _get_ports_by_vidpid(include_links=False)
+    matched_ports = list(ports_by_vidpid.get((vendor_id, product_id), []))
 
     if len(matched_ports) == 1:
         return matched_ports[0].device
@@ -125,6 +124,15 @@ class SerialData(object):
         self.retry_limit = retry_limit
         self.retry_delay = retry_delay
 
+        # Bytes read from the port but not yet returned by read().
+        self._read_buffer = bytearray()
+
+        # The timestamp of the readings only changes once a second.
+        self._last_ts_sec = -1
+        self._last_ts_str = ''
+
+        # Plain device paths like /dev/ttyUSB0 go straight to serial.Serial, only
+        # URLs such as loop:// look up a protocol handler.
         self.ser = serial.serial_for_url(port, do_not_open=True)
 
         # Configure the PySerial class.
@@ -181,6 +189,8 @@ class SerialData(object):
             if not self.is_connected:  # pragma: no cover
                 raise error.BadSerialConnection(msg=f'Serial connection {self.name} is not open')
         except serial.serialutil.SerialException as err:
+            # The device may have gone away so list the ports again next time.
+            _PORT_CACHE.clear()
             raise error.BadSerialConnection(msg=err)
         self.logger.debug(f'Serial connection established to {self.name}')
 
@@ -218,28 +228,97 @@ class SerialData(object):
         Returns:
             Bytes read from the port.
         """
+        buf = self._read_buffer
+        if buf:
+            # Return anything already read from the port by read() first.
+            data = bytes(buf[:size])
+            del buf[:size]
+            if len(data) < size:
+                data += self.ser.read(size=size - len(data))
+            return data
+
         return self.ser.read(size=size)
 
+    def read_available(self):
+        """Reads all the bytes waiting on the serial port in one call.
+
+        Unlike ~read_bytes this doesn't need to know how many bytes to ask for. If nothing
+        is waiting this will wait for a single byte, up to the read timeout.
+
+        Returns:
+            Bytes read from the port, including any read but not yet returned by ~read.
+        """
+        buf = self._read_buffer
+        data = self.ser.read(size=self.ser.in_waiting or (0 if buf else 1))
+        if buf:
+            data = bytes(buf) + data
+            buf.clear()
+
+        return data
+
     def read(self, retry_limit=None, retry_delay=None):
         """Reads next line of input using readline.
 
         If no response is given, delay for retry_delay and then try to read
         again. Fail after retry_limit attempts.
         """
+        return self._read_retry(self._read_line, retry_limit, retry_delay) or ''
+
+    def _read_retry(self, read_line, retry_limit=None, retry_delay=None):
+        """Call `read_line` until it returns a line, see ~read, returning None if it never does."""
         if retry_limit is None:
             retry_limit = self.retry_limit
         if retry_delay is None:
             retry_delay = self.retry_delay
 
-        data = ''
         for _ in range(retry_limit):
-            line = self.ser.readline()
+            line = read_line()
             if line:
-                data = line.decode(encoding='ascii')
-                break
+                return line
             time.sleep(retry_delay)
 
-        return data
+        return None
+
+    def _read_line(self):
+        """Return the next line, including the newline, or whatever arrived before the timeout."""
+        end = self._buffer_line()
+        line = self._read_buffer[:end]
+        # Deleting from the front of a bytearray only moves its start offset, so the
+        # buffer already behaves like a ring buffer without a class of our own.
+        del self._read_buffer[:end]
+        # Decode after removing the line so a line that isn't ascii is still consumed.
+        return line.decode(encoding='ascii')
+
+    def _read_line_bytes(self):
+        """Return the next line as bytes, see ~_read_line."""
+        end = self._buffer_line()
+        line = bytes(self._read_buffer[:end])
+        del self._read_buffer[:end]
+        return line
+
+    def _buffer_line(self):
+        """Read from the port until a line is buffered and return the length of the line.
+
+        Everything waiting on the port is read at once into a buffer and the lines are
+        split off from there, which is much faster than ``readline``, which reads one
+        byte at a time. ``readline`` is only used to wait for more data to arrive.
+        """
+        buf = self._read_buffer
+        end = buf.find(b'\n') + 1
+        if not end:
+            waiting = self.ser.in_waiting
+            if waiting:
+                buf += self.ser.read(waiting)
+                end = buf.find(b'\n') + 1
+
+        if not end:
+            buf += self.ser.readline()
+            end = buf.find(b'\n') + 1
+            if not end:
+                # Timed out, return the partial line like readline does.
+                end = len(buf)
+
+        return end
 
     def get_reading(self):
         """Reads and returns a line, along with the timestamp of the read.
@@ -251,10 +330,19 @@ class SerialData(object):
         # Get the timestamp after the read so that a long delay on reading doesn't make it
         # appear that the read happened much earlier than it did.
         line = self.read()
-        ts = time.strftime('%Y-%m-%dT%H:%M:%S %Z', time.gmtime())
+        ts = self._timestamp()
         info = (ts, line)
         return info
 
+    def _timestamp(self):
+        """Return the current time as a string, formatting it at most once a second."""
+        sec = int(time.time())
+        if sec != self._last_ts_sec:
+            self._last_ts_str = time.strftime('%Y-%m-%dT%H:%M:%S %Z', time.gmtime(sec))
+            self._last_ts_sec = sec
+
+        return self._last_ts_str
+
     def get_and_parse_reading(self, retry_limit=5):
         """Reads a line of JSON text and returns the decoded value, along with the current time.
 
@@ -267,7 +355,9 @@ class SerialData(object):
         """
         reading = None
         for _ in range(max(1, retry_limit)):
-            (ts, line) = self.get_reading()
+            # The JSON parser reads bytes, so the line doesn't need to be decoded first.
+            line = self._read_retry(self._read_line_bytes)
+            ts = self._timestamp()
 
             with suppress(error.InvalidDeserialization, TypeError):
                 data = serializers.from_json(line)
@@ -285,6 +375,7 @@ class SerialData(object):
         out any buffered input from a device, and then read the next full line, which likely
         requires tossing out a fragment of a line).
         """
+        self._read_buffer.clear()
         self.ser.reset_input_buffer()
 
     def __del__(self):
@@ -1,16 +1,22 @@
 import operator
-from collections import deque
+import time
+from collections import defaultdict, deque
 from contextlib import suppress
 from dataclasses import dataclass
-from typing import Optional, Union, Callable
+from functools import partial
+from typing import Optional, Union, Callable, Iterable, Iterator, Tuple
 
 import serial
 from loguru import logger
 from serial.threaded import LineReader, ReaderThread
 from serial.tools.list_ports import comports as get_comports
+from serial.tools.list_ports_common import ListPortInfo
 
 from panoptes.utils import error
 
+# Cached ports, keyed by the `include_links` option of the listing.
+_PORT_CACHE = dict()
+
 
 @dataclass
 class SerialDeviceDefaults:
@@ -73,10 +79,48 @@ def get_serial_port_info():
         >>> devices[0].hwid     # doctest: +SKIP
         'USB VID:PID=2886:802D SER=3C788B875337433838202020FF122204 LOCATION=3-5:1.0'
 
+    The ports are cached for a few seconds because listing them can be slow, see
+    ~refresh_serial_port_info to list them again right away, e.g. after plugging in
+    a device.
+
     Returns: a list of PySerial's ListPortInfo objects. See:
         https://github.com/pyserial/pyserial/blob/master/serial/tools/list_ports_common.py
     """
-    return sorted(get_comports(include_links=True), key=operator.attrgetter('device'))
+    return list(_get_ports_cached())
+
+
+def refresh_serial_port_info():
+    """Clear the cached serial ports and return the ports defined on the system.
+
+    Returns: a list of PySerial's ListPortInfo objects, see ~get_serial_port_info.
+    """
+    _PORT_CACHE.clear()
+    return get_serial_port_info()
+
+
+def _get_ports_cached(include_links=True, ttl=3.0):
+    """Return the sorted serial ports, listing them again if older than `ttl` seconds."""
+    return _get_port_cache(include_links=include_links, ttl=ttl)[1]
+
+
+def _get_ports_by_vidpid(include_links=True, ttl=3.0):
+    """Return the cached serial ports as a dict of lists keyed by (vendor_id, product_id)."""
+    return _get_port_cache(include_links=include_links, ttl=ttl)[2]
+
+
+def _get_port_cache(include_links=True, ttl=3.0):
+    """Return the (timestamp, ports, ports by vid/pid) cache entry, refreshing it if needed."""
+    now = time.monotonic()
+    cached = _PORT_CACHE.get(include_links)
+    if cached is None or now - cached[0] > ttl:
+        ports = sorted(get_comports(include_links=include_links),
+                       key=operator.attrgetter('device'))
+        by_vidpid = defaultdict(list)
+        for port in ports:
+            by_vidpid[(port.vid, port.pid)].append(port)
+        cached = _PORT_CACHE[include_links] = (now, ports, dict(by_vidpid))
+
+    return cached
 
 
 def find_serial_port(vendor_id, product_id, return_all=False):  # pragma: no cover
@@ -104,9 +148,8 @@ def find_serial_port(vendor_id, product_id, return_all=False):  # pragma: no cov
     Returns:
         str or list: Either the path to the detected port or a list of all comports that match.
     """
-    # Get all serial ports.
-    matched_ports = [p for p in get_serial_port_info() if
-                     p.vid == vendor_id and p.pid == product_id]
+    # Look up the matching serial ports.
+    matched_ports = list(_get_ports_by_vidpid().get((vendor_id, product_id), []))
 
     if len(matched_ports) == 1:
         return matched_ports[0].device
@@ -117,6 +160,63 @@ def find_serial_port(vendor_id, product_id, return_all=False):  # pragma: no cov
             f'No serial ports for vendor_id={vendor_id:x} and product_id={product_id:x}')
 
 
+def iter_candidate_ports(known_vidpids: Iterable[Tuple[int, int]]) -> Iterator[ListPortInfo]:
+    """Yield the serial ports with a known vendor and product id first, then all the others.
+
+    When probing the ports for a device, trying the likely ports first avoids waiting
+    for a read timeout on each of the unrelated ports.
+
+    .. doctest::
+
+        >>> from panoptes.utils.serial.device import iter_candidate_ports
+        >>> arduino_uno = (0x2a03, 0x0043)
+        >>> for port in iter_candidate_ports({arduino_uno}):  # doctest: +SKIP
+        ...     device = SerialDevice(port=port.device)
+
+    Args:
+        known_vidpids (set): The (vendor_id, product_id) pairs to try first.
+
+    Yields:
+        ListPortInfo: The serial ports, see ~get_serial_port_info.
+    """
+    known_vidpids = set(known_vidpids)
+    matching = list()
+    others = list()
+    for port in get_serial_port_info():
+        if (port.vid, port.pid) in known_vidpids:
+            matching.append(port)
+        else:
+            others.append(port)
+
+    yield from matching
+    yield from others
+
+
+class _CallbackLineReader(LineReader):
+    """A threaded line reader that adds the lines to the readings of a ~SerialDevice.
+
+    The lines are passed through the callback first, if given, and only added if the
+    callback doesn't return None.
+    """
+
+    def __init__(self, device, callback=None):
+        super().__init__()
+        self.device = device
+        self.callback = callback if callable(callback) else None
+
+    def connection_lost(self, exc):
+        logger.trace(f'Disconnected from {self.device}')
+
+    def handle_line(self, data):
+        try:
+            if self.callback is not None:
+                data = self.callback(data)
+            if data is not None:
+                self.device.readings.append(data)
+        except Exception as e:
+            logger.trace(f'Error with callback: {e!r}')
+
+
 class SerialDevice(object):
     def __init__(self,
                  port: str = None,
@@ -175,10 +275,14 @@ class SerialDevice(object):
 
         """
         self.name = name or port
+        # The reader thread only appends and deque's append and popleft are atomic, so
+        # it is already a safe single-producer single-consumer queue.
         self.readings = deque(maxlen=reader_queue_size)
         self.reader_thread = None
         self._reader_callback = reader_callback
 
+        # Plain device paths like /dev/ttyUSB0 go straight to serial.Serial, only
+        # URLs such as loop:// look up a protocol handler.
         self.serial: serial.Serial = serial.serial_for_url(port)
         logger.debug(f'SerialDevice for {self.name} created. Connected={self.is_connected}')
 
@@ -203,7 +307,12 @@ class SerialDevice(object):
     def connect(self):
         """Connect to device and add default reader."""
         if not self.is_connected:
-            self.serial.open()
+            try:
+                self.serial.open()
+            except serial.SerialException:
+                # The device may have gone away so list the ports again next time.
+                _PORT_CACHE.clear()
+                raise
             self._add_stream_reader()
 
     def disconnect(self):
@@ -212,6 +321,26 @@ class SerialDevice(object):
             self.serial.close()
             self.reader_thread = None
 
+    def drain_readings(self, max_n=None):
+        """Remove and return the oldest readings.
+
+        This is safe while the reader thread is adding new readings.
+
+        Args:
+            max_n (int, optional): The maximum number of readings to return, default
+                None for all of them.
+
+        Returns:
+            list: The readings, oldest first.
+        """
+        readings = self.readings
+        num_readings = len(readings)
+        if max_n is not None:
+            num_readings = min(max_n, num_readings)
+
+        popleft = readings.popleft
+        return [popleft() for _ in range(num_readings)]
+
     def write(self, line):
         """Write to the serial device.
 
@@ -225,25 +354,8 @@ class SerialDevice(object):
 
         callback = callback or self._reader_callback
 
-        # Set up a custom threaded reader class that calls user callback.
-        class CustomReader(LineReader):
-            # Use `this` so `self` still refers to device instance.
-            def connection_made(this, transport):
-                super(LineReader, this).connection_made(transport)
-
-            def connection_lost(this, exc):
-                logger.trace(f'Disconnected from {self}')
-
-            def handle_line(this, data):
-                try:
-                    if callback and callable(callback):
-                        data = callback(data)
-                    if data is not None:
-                        self.readings.append(data)
-                except Exception as e:
-                    logger.trace(f'Error with callback: {e!r}')
-
-        self.reader_thread = ReaderThread(self.serial, CustomReader)
+        reader_factory = partial(_CallbackLineReader, self, callback)
+        self.reader_thread = ReaderThread(self.serial, reader_factory)
         self.reader_thread.start()
 
     def __str__(self):
@@ -1,11 +1,17 @@
+import dataclasses
 import os
 import shutil
 import subprocess
+import sys
 from contextlib import suppress
 
+import numpy as np
 import pytest
 from astropy import units as u
+from astropy.io import fits
 from astropy.io.fits import Header
+from astropy.time import Time
+from astropy.wcs import WCS
 
 from panoptes.utils import error
 from panoptes.utils.images import fits as fits_utils
@@ -19,6 +25,14 @@ def test_wcsinfo(solved_fits_file):
     assert wcsinfo['ra_center'].value == pytest.approx(303.20, rel=1e-2)
 
 
+@pytest.mark.plate_solve
+def test_wcsinfo_values(solved_fits_file):
+    wcsinfo = fits_utils.get_wcsinfo_values(solved_fits_file)
+
+    assert wcsinfo['ra_center'] == pytest.approx(303.20, rel=1e-2)
+    assert fits_utils.WCSINFO_UNITS['ra_center'] == 'deg'
+
+
 @pytest.mark.plate_solve
 def test_fpack(solved_fits_file):
     new_file = solved_fits_file.replace('solved', 'solved_copy')
@@ -35,6 +49,102 @@ def test_fpack(solved_fits_file):
     os.remove(copy_file)
 
 
+@pytest.mark.plate_solve
+def test_fpack_tile(solved_fits_file):
+    new_file = solved_fits_file.replace('solved', 'solved_tile')
+    copy_file = shutil.copyfile(solved_fits_file, new_file)
+
+    uncompressed = fits_utils.funpack(copy_file)
+    compressed = fits_utils.fpack(uncompressed, tile=(100, 100))
+    with fits.open(compressed, disable_image_compression=True) as hdul:
+        assert hdul[1].header['ZTILE1'] == 100
+        assert hdul[1].header['ZTILE2'] == 100
+
+    os.remove(compressed)
+
+
+@pytest.mark.plate_solve
+def test_fpack_batch(solved_fits_file):
+    copies = [shutil.copyfile(solved_fits_file, solved_fits_file.replace('solved', f'solved_{i}'))
+              for i in range(3)]
+
+    uncompressed = fits_utils.fpack_batch(copies, unpack=True)
+    assert uncompressed == [fn.replace('.fz', '') for fn in copies]
+
+    compressed = fits_utils.fpack_batch(uncompressed, max_workers=2)
+    assert compressed == copies
+    for fn in compressed:
+        assert os.path.exists(fn)
+        os.remove(fn)
+
+
+def test_get_solve_field_batch_unsolved(monkeypatch, solved_fits_file, unsolved_fits_file):
+    def no_solution(fname, **kwargs):
+        # Runs but doesn't write any output files, like solve-field without a match.
+        return subprocess.Popen([sys.executable, '-c', ''], universal_newlines=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    monkeypatch.setattr(fits_utils, 'solve_field', no_solution)
+
+    with pytest.raises(error.SolveError):
+        fits_utils.get_solve_field(unsolved_fits_file)
+
+    solved, unsolved = fits_utils.get_solve_field_batch([solved_fits_file, unsolved_fits_file])
+    assert solved['solved_fits_file'] == solved_fits_file
+    assert unsolved is None
+
+
+def test_get_solve_field_fz_temp_copy(monkeypatch, tmp_path, solved_fits_file):
+    # A FITS file next to the compressed one must not be touched.
+    sibling = solved_fits_file[:-len('.fz')]
+    with open(sibling, 'wb') as f:
+        f.write(b'user data')
+
+    tmp_dir = tmp_path / 'solve'
+    tmp_dir.mkdir()
+    monkeypatch.setattr(fits_utils.tempfile, 'mkdtemp', lambda: str(tmp_dir))
+
+    def failing_solve(fname, **kwargs):
+        assert os.path.dirname(fname) == str(tmp_dir)
+        raise error.InvalidSystemCommand('solve-field broke')
+
+    monkeypatch.setattr(fits_utils, 'solve_field', failing_solve)
+
+    with pytest.raises(error.InvalidSystemCommand):
+        fits_utils.get_solve_field(solved_fits_file, skip_solved=False)
+
+    assert not tmp_dir.exists()
+    with open(sibling, 'rb') as f:
+        assert f.read() == b'user data'
+
+
+def test_get_solve_field_hint_options(monkeypatch, unsolved_fits_file):
+    solve_kwargs = dict()
+
+    def capture_solve(fname, **kwargs):
+        solve_kwargs.update(kwargs)
+        raise error.InvalidSystemCommand('stop here')
+
+    monkeypatch.setattr(fits_utils, 'solve_field', capture_solve)
+
+    with pytest.raises(error.InvalidSystemCommand):
+        fits_utils.get_solve_field(unsolved_fits_file, hint_from=(10., 20.))
+    assert (solve_kwargs['ra'], solve_kwargs['dec'], solve_kwargs['radius']) == (10., 20., 3)
+
+    # The caller's options win over the hint.
+    solve_kwargs.clear()
+    with pytest.raises(error.InvalidSystemCommand):
+        fits_utils.get_solve_field(unsolved_fits_file, hint_from=(10., 20.),
+                                   **{'--radius': 10, '--dec': 25.})
+    assert solve_kwargs['ra'] == 10.
+    assert 'dec' not in solve_kwargs and 'radius' not in solve_kwargs
+
+
+def test_fpack_bad_method(tiny_fits_file):
+    with pytest.raises(ValueError):
+        fits_utils.fpack(tiny_fits_file, method='zip')
+
+
 @pytest.mark.plate_solve
 def test_no_overwrite_fpack(solved_fits_file):
     new_file = solved_fits_file.replace('solved', 'solved_copy')
@@ -59,16 +169,91 @@ def test_no_overwrite_fpack(solved_fits_file):
             os.remove(file)
 
 
+@pytest.mark.parametrize('path', [
+    'gs://panoptes-images-background/PAN012/Hd189733/358d0f/20180824T035917/20180824T040118.fits',
+    'PAN012/358d0f/20180824T035917/20180824T040118.fits.fz',
+    '/var/panoptes/images/fields/PAN001/Wasp 1/ABCDEF/20200101T000000/20200101T000100',
+    'PAN001PAN002/field/358d0f/20180824T035917/20180824T040118/extra/path',
+    'PAN012/358d0f/20180824T035917/20180824T040118/358d0f/20180824T035917/20180824T040118',
+    'PAN012/358d0f/20180824T035917',
+    'PAN01/358d0f/20180824T035917/20180824T040118',
+    'PAN012' + '/PAN012' * 100 + '/x',
+    'foobar',
+])
+def test_observation_path_matches_path_matcher(path):
+    path_match = fits_utils.PATH_MATCHER.match(path)
+    expected = None
+    if path_match is not None:
+        expected = path_match.group('unit_id', 'field_name', 'camera_id',
+                                    'sequence_time', 'image_time')
+
+    assert fits_utils._parse_observation_path(path) == expected
+
+
 def test_getheader(solved_fits_file):
     header = fits_utils.getheader(solved_fits_file)
     assert isinstance(header, Header)
     assert header['IMAGEID'] == 'PAN001_XXXXXX_20160909T081152'
 
 
+@pytest.mark.parametrize('fits_file', ['solved.fits.fz', 'unsolved.fits', 'tiny.fits',
+                                       'pole.fits', 'rotation.fits', 'noheader.fits'])
+def test_is_celestial_header(data_dir, fits_file):
+    header = fits_utils.getheader(os.path.join(data_dir, fits_file))
+    assert fits_utils._is_celestial_header(header) == WCS(header).is_celestial
+
+
+@pytest.mark.parametrize('ctypes,expected', [
+    (('RA---TAN', 'DEC--TAN'), True),
+    (('GLON-CAR', 'GLAT-CAR'), True),
+    (('DEC--TAN', 'RA---TAN'), True),
+    (('LINEAR', 'LINEAR'), False),
+])
+def test_is_celestial_header_ctypes(ctypes, expected):
+    header = Header([('NAXIS', 2), ('CTYPE1', ctypes[0]), ('CTYPE2', ctypes[1])])
+    assert fits_utils._is_celestial_header(header) is expected
+    assert WCS(header).is_celestial is expected
+
+
+def test_getdata_section(solved_fits_file):
+    data, header = fits_utils.getdata(solved_fits_file, section=np.s_[:2, :3], header=True)
+    assert data.shape == (2, 3)
+    assert header['FIELD'] == 'KIC 8462852'
+
+    # Other options aren't applied to a section so aren't accepted.
+    with pytest.raises(TypeError):
+        fits_utils.getdata(solved_fits_file, 0, section=np.s_[:2, :3])
+    with pytest.raises(TypeError):
+        fits_utils.getdata(solved_fits_file, section=np.s_[:2, :3], ext=0)
+
+
+def test_getheader_cached(tiny_fits_file):
+    header = fits_utils.getheader(tiny_fits_file)
+    header['IMAGEID'] = 'modified'
+
+    # Modifying the returned header doesn't change the cached one.
+    assert fits_utils.getheader(tiny_fits_file)['IMAGEID'] == 'PAN001_XXXXXX_20160909T081152'
+
+    # Changes to the file are picked up.
+    fits_utils.update_observation_headers(tiny_fits_file, {'field_name': 'Cached Field'})
+    assert fits_utils.getheader(tiny_fits_file)['FIELD'] == 'Cached Field'
+    assert fits_utils.getval(tiny_fits_file, 'FIELD') == 'Cached Field'
+
+    # So are edits made in place elsewhere that keep the size and modification time.
+    stat = os.stat(tiny_fits_file)
+    fits.setval(tiny_fits_file, 'FIELD', value='Edited Field')
+    os.utime(tiny_fits_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(tiny_fits_file).st_size == stat.st_size
+    assert fits_utils.getheader(tiny_fits_file)['FIELD'] == 'Edited Field'
+
+
 def test_getval(solved_fits_file):
     img_id = fits_utils.getval(solved_fits_file, 'IMAGEID')
     assert img_id == 'PAN001_XXXXXX_20160909T081152'
 
+    with pytest.raises(KeyError):
+        fits_utils.getval(solved_fits_file, 'NOTAKEY')
+
 
 @pytest.mark.plate_solve
 def test_solve_field_unsolved(unsolved_fits_file):
@@ -117,3 +302,26 @@ def test_solve_bad_field():
     print('outs', outs)
     print('errs', errs)
     assert 'ERROR' in errs
+
+
+def test_write_fits_removed_dir(tmp_path):
+    data = np.arange(100)
+    obs_dir = tmp_path / 'observation'
+    fits_utils.write_fits(data, {'FILE': 'first'}, str(obs_dir / 'first.fits'))
+
+    # The directory is cleaned up between sequences.
+    shutil.rmtree(obs_dir)
+    fits_utils.write_fits(data, {'FILE': 'second'}, str(obs_dir / 'second.fits'))
+    assert fits_utils.getval(str(obs_dir / 'second.fits'), 'FILE') == 'second'
+
+
+def test_observation_path_info_fields():
+    path = 'PAN012/Hd189733/358d0f/20180824T035917/20180824T040118.fits'
+    path_info = fits_utils.ObservationPathInfo(path=path)
+    assert path_info.image_id == 'PAN012_358d0f_20180824T040118'
+    assert list(dataclasses.asdict(path_info)) == ['unit_id', 'camera_id', 'field_name',
+                                                   'sequence_time', 'image_time', 'path']
+
+    # A new time is flattened again.
+    path_info.image_time = Time('2018-08-24T04:05:00')
+    assert path_info.image_id == 'PAN012_358d0f_20180824T040500'
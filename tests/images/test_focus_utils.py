@@ -1,5 +1,6 @@
 import os
 
+import numpy as np
 import pytest
 from astropy.io import fits
 
@@ -17,6 +18,29 @@ def test_vollath_f4(data_dir):
         focus_utils.vollath_F4(data, axis='Z')
 
 
+def test_vollath_f4_masked(data_dir):
+    data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))
+    data = mask_saturated(data, saturation_level=5000).astype('float64')
+    assert data.mask.any()
+
+    # Masked values are excluded from the means.
+    f4_y = (data[1:] * data[:-1]).mean() - (data[2:] * data[:-2]).mean()
+    f4_x = (data[:, 1:] * data[:, :-1]).mean() - (data[:, 2:] * data[:, :-2]).mean()
+    assert focus_utils.vollath_F4(data, axis='Y') == pytest.approx(f4_y)
+    assert focus_utils.vollath_F4(data, axis='X') == pytest.approx(f4_x)
+
+
+def test_vollath_f4_no_overflow():
+    # Products of large uint16 values overflow if not accumulated as float64.
+    rng = np.random.default_rng(42)
+    data = rng.integers(60000, 65535, size=(100, 120), dtype=np.uint16)
+
+    as_float = data.astype('float64')
+    f4_y = (as_float[1:] * as_float[:-1]).mean() - (as_float[2:] * as_float[:-2]).mean()
+    assert focus_utils.vollath_F4(data, axis='Y') == pytest.approx(f4_y)
+    assert data.dtype == np.uint16
+
+
 def test_focus_metric_default(data_dir):
     data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))
     data = mask_saturated(data)
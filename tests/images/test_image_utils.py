@@ -1,14 +1,22 @@
 import os
+import shutil
 import tempfile
+from concurrent.futures import Executor, Future
+from functools import partial
 
 import numpy as np
 import pytest
+from PIL import Image
 from astropy import units as u
 from astropy.nddata import Cutout2D
 
 from panoptes.utils import error
+from panoptes.utils.images import fits as fits_utils
 from panoptes.utils.images import make_pretty_image
-from panoptes.utils.images.misc import crop_data, mask_saturated
+from panoptes.utils.images import make_pretty_image_async
+from panoptes.utils.images.cr2 import read_pgm
+from panoptes.utils.images.misc import crop_data, crop_data_batch, mask_saturated
+from panoptes.utils.images.misc import mask_saturated_arrays, _make_thumbnails
 
 
 def test_mask_saturated():
@@ -22,6 +30,69 @@ def test_mask_saturated():
     assert mask_saturated(ones.astype('int8')).sum() == 99.0
 
 
+def test_mask_saturated_return_mask():
+    data = np.array([[10, 200, 250], [0, 201, 255]], dtype=np.uint8)
+    masked = mask_saturated(data, saturation_level=200.5)
+
+    plain, mask = mask_saturated(data, saturation_level=200.5, return_mask=True)
+    assert isinstance(plain, np.ndarray) and not isinstance(plain, np.ma.MaskedArray)
+    assert plain.dtype == np.uint8
+    np.testing.assert_array_equal(plain, data)
+    np.testing.assert_array_equal(mask, masked.mask)
+
+    plain, mask = mask_saturated(data, saturation_level=200.5, dtype=np.float32, return_mask=True)
+    assert plain.dtype == np.float32
+    np.testing.assert_array_equal(mask, masked.mask)
+
+    # An existing mask is kept.
+    data = np.ma.array(data, mask=[[True, False, False], [False, False, False]])
+    _, mask = mask_saturated(data, saturation_level=200.5, return_mask=True)
+    np.testing.assert_array_equal(mask, [[True, False, True], [False, True, True]])
+
+
+def test_mask_saturated_arrays():
+    data = np.array([[10, 200, 250], [0, 201, 255]], dtype=np.uint8)
+    plain, mask = mask_saturated_arrays(data, bit_depth=8 * u.bit, threshold=0.8)
+    assert type(plain) is np.ndarray and type(mask) is np.ndarray
+    np.testing.assert_array_equal(mask, [[False, False, True], [False, False, True]])
+
+    masked = mask_saturated(data, bit_depth=8 * u.bit, threshold=0.8)
+    np.testing.assert_array_equal(mask, masked.mask)
+
+
+def test_mask_saturated_clip():
+    data = np.array([10, 200, 250], dtype=np.uint8)
+    clipped = mask_saturated(data, saturation_level=200, clip=True)
+    assert clipped.dtype == np.uint8
+    np.testing.assert_array_equal(clipped, [10, 200, 200])
+    np.testing.assert_array_equal(data, [10, 200, 250])
+
+    clipped, mask = mask_saturated(data, saturation_level=200, clip=True, return_mask=True)
+    np.testing.assert_array_equal(clipped, [10, 200, 200])
+    np.testing.assert_array_equal(mask, [False, False, True])
+
+
+def test_mask_saturated_out():
+    data = np.array([[10, 200, 250], [0, 201, 255]], dtype=np.uint8)
+    data_buf = np.empty(data.shape, dtype=np.float32)
+    mask_buf = np.empty(data.shape, dtype=bool)
+
+    plain, mask = mask_saturated(data, saturation_level=200, out=(data_buf, mask_buf),
+                                 return_mask=True)
+    assert plain is data_buf
+    assert mask is mask_buf
+    np.testing.assert_array_equal(plain, data)
+    np.testing.assert_array_equal(mask, data > 200)
+
+    masked = mask_saturated(data, saturation_level=200, out=(data_buf, None))
+    assert masked.dtype == np.float32
+    assert np.shares_memory(masked, data_buf)
+    np.testing.assert_array_equal(masked.mask, data > 200)
+
+    clipped = mask_saturated(data, saturation_level=200, out=(data_buf, None), clip=True)
+    np.testing.assert_array_equal(clipped, [[10, 200, 200], [0, 200, 200]])
+
+
 def test_mask_saturated_bad():
     ones = np.ones((10, 10))
     ones[0, 0] = 256
@@ -32,6 +103,26 @@ def test_mask_saturated_bad():
         mask_saturated(ones)
 
 
+@pytest.mark.parametrize('width,height', [(4, 3), (6000, 2), (1, 10000)])
+def test_read_pgm(tmp_path, width, height):
+    data = np.arange(width * height, dtype='>u2').reshape((height, width))
+    pgm_path = tmp_path / 'test.pgm'
+    pgm_path.write_bytes(f'P5\n{width} {height}\n65535\n'.encode() + data.tobytes())
+
+    pgm = read_pgm(pgm_path, remove_after=True)
+    assert pgm.shape == (height, width)
+    assert pgm.dtype.isnative
+    assert (pgm == np.flipud(data)).all()
+    assert not pgm_path.exists()
+
+
+def test_read_pgm_bad_file(tmp_path):
+    pgm_path = tmp_path / 'test.pgm'
+    pgm_path.write_bytes(b'P2\n2 2\n255\n0 0 0 0')
+    with pytest.raises(ValueError):
+        read_pgm(pgm_path)
+
+
 def test_crop_data():
     ones = np.ones((201, 201))
     assert ones.sum() == 40401.
@@ -56,6 +147,41 @@ def test_crop_data():
     # Box is 20 pixels wide so center is at 10,10
     assert cropped04.position_cutout == (10, 10)
 
+    # Boxes over the edge are trimmed.
+    cropped05 = crop_data(ones, box_width=10, center=(2, 198))
+    assert cropped05.shape == (8, 7)
+
+    with pytest.raises(ValueError):
+        crop_data(np.ones((201, 100)), box_width=150)
+
+
+@pytest.mark.parametrize('box_width,center', [(200, None), (100, (600, 400)), (51, (3, 7))])
+def test_crop_data_fits(solved_fits_file, unsolved_fits_file, box_width, center):
+    for fits_fn in [solved_fits_file, unsolved_fits_file]:
+        data = fits_utils.getdata(fits_fn)
+        expected = crop_data(data, box_width=box_width, center=center)
+
+        cropped = crop_data(fits_fn, box_width=box_width, center=center)
+        np.testing.assert_array_equal(cropped, expected)
+
+        cutout = crop_data(fits_fn, box_width=box_width, center=center, data_only=False)
+        assert isinstance(cutout, Cutout2D)
+        np.testing.assert_array_equal(cutout.data, expected)
+
+
+@pytest.mark.parametrize('box_width', [20, 21])
+def test_crop_data_batch(unsolved_fits_file, box_width):
+    data = fits_utils.getdata(unsolved_fits_file)
+    centers = [(15, 15), (600, 400), (data.shape[1] - 11, data.shape[0] - 11)]
+
+    stack = crop_data_batch(data, centers, box_width=box_width)
+    assert stack.shape == (len(centers), box_width, box_width)
+    for cutout, center in zip(stack, centers):
+        np.testing.assert_array_equal(cutout, crop_data(data, box_width=box_width, center=center))
+
+    with pytest.raises(ValueError):
+        crop_data_batch(data, [(600, 400), (5, 5)], box_width=box_width)
+
 
 def test_make_pretty_image(solved_fits_file, tiny_fits_file, save_environ):
     # Make a dir and put test image files in it.
@@ -88,6 +214,44 @@ def test_make_pretty_image(solved_fits_file, tiny_fits_file, save_environ):
         assert not os.path.isdir(imgdir)
 
 
+def test_make_pretty_image_async(solved_fits_file, tmp_path):
+    link_path = tmp_path / 'latest.jpg'
+    future = make_pretty_image_async(solved_fits_file, link_path=str(link_path))
+    pretty = future.result(timeout=60)
+    assert pretty == link_path
+    assert pretty.exists()
+
+
+def test_make_pretty_image_async_link_order(solved_fits_file, tmp_path):
+    class ManualExecutor(Executor):
+        """Runs the submitted calls only when asked, in any order."""
+
+        def __init__(self):
+            self.calls = list()
+
+        def submit(self, fn, *args, **kwargs):
+            future = Future()
+            self.calls.append((future, partial(fn, *args, **kwargs)))
+            return future
+
+    first_fits = solved_fits_file
+    second_fits = shutil.copy(solved_fits_file, str(tmp_path / 'second.fits.fz'))
+    link_path = tmp_path / 'latest.jpg'
+
+    executor = ManualExecutor()
+    first = make_pretty_image_async(first_fits, executor=executor, link_path=str(link_path))
+    second = make_pretty_image_async(second_fits, executor=executor, link_path=str(link_path))
+
+    # The newer image finishes first.
+    for future, call in reversed(executor.calls):
+        future.set_result(call())
+
+    assert second.result() == link_path
+    first_jpg = first.result()
+    assert first_jpg != link_path and first_jpg.exists()
+    assert os.readlink(link_path) == str(second_fits).replace('.fits.fz', '.jpg')
+
+
 def test_make_pretty_image_cr2_fail():
     with tempfile.TemporaryDirectory() as tmpdir:
         tmpfile = os.path.join(tmpdir, 'bad.cr2')
@@ -113,3 +277,56 @@ def test_make_pretty_image_cr2(cr2_file, tmpdir):
     assert pretty_path.exists()
     assert pretty_path.as_posix() == link_path
     assert os.path.exists(cr2_file) is False
+
+
+def test_make_thumbnails(tmp_path):
+    img_dir = tmp_path / 'images'
+    img_dir.mkdir()
+    out_dir = tmp_path / 'thumbnails'
+    out_dir.mkdir()
+    fnames = list()
+    for i in range(2):
+        fname = str(img_dir / f'20200101T00000{i}.jpg')
+        Image.new('RGB', (4000, 3000)).save(fname)
+        fnames.append(fname)
+
+    assert _make_thumbnails(fnames, str(out_dir)) == str(out_dir)
+    for fname in fnames:
+        with Image.open(out_dir / os.path.basename(fname)) as img:
+            assert img.size == (1440, 1080)
+
+
+def test_make_timelapse_bad_frame(monkeypatch, tmp_path):
+    from panoptes.utils.images import misc
+    img_dir = tmp_path / 'field' / 'camera' / '20200101T000000'
+    img_dir.mkdir(parents=True)
+    Image.new('RGB', (40, 30)).save(img_dir / '20200101T000001.jpg')
+    (img_dir / '20200101T000002.jpg').write_bytes(b'not a jpeg')
+
+    thumbnails_dir = tmp_path / 'thumbnails'
+    thumbnails_dir.mkdir()
+    monkeypatch.setattr(misc.shutil, 'which', lambda cmd: '/usr/bin/ffmpeg')
+    monkeypatch.setattr(misc.tempfile, 'mkdtemp', lambda: str(thumbnails_dir))
+
+    with pytest.raises(error.PanError):
+        misc.make_timelapse(str(img_dir), prefer_thumbnails=True)
+    assert not thumbnails_dir.exists()
+
+
+def test_cr2_batch_to_jpg_errors(monkeypatch, tmp_path):
+    from panoptes.utils.images import cr2
+    # A command that fails for every file.
+    monkeypatch.setattr(cr2, '_EXIFTOOL', shutil.which('false'))
+
+    exists = tmp_path / 'exists.cr2'
+    exists.with_suffix('.jpg').write_bytes(b'')
+    missing = tmp_path / 'missing.cr2'
+
+    assert cr2.cr2_batch_to_jpg([exists, missing]) == [None, None]
+
+
+def test_cr2_batch_to_fits_errors(tmp_path):
+    from panoptes.utils.images import cr2
+    # An unknown option makes each conversion raise in its worker.
+    cr2_list = [tmp_path / 'first.cr2', tmp_path / 'second.cr2']
+    assert cr2.cr2_batch_to_fits(cr2_list, max_workers=1, not_an_option=True) == [None, None]
@@ -1,3 +1,5 @@
+import time
+
 import pytest
 
 from panoptes.utils import error
@@ -47,3 +49,68 @@ def test_usage():
 
     ser.disconnect()
     assert not ser.is_connected
+
+
+def test_read_buffered_lines():
+    ser = rs232.SerialData(port='loop://', timeout=0.1)
+    ser.write('first\nsecond\nthi')
+    assert ser.read() == 'first\n'
+    assert ser.read() == 'second\n'
+    assert ser.read_bytes(2) == b'th'
+    ser.write('rd\n')
+    assert ser.read() == 'ird\n'
+    ser.write('partial')
+    assert ser.read(retry_limit=1) == 'partial'
+    ser.disconnect()
+
+
+def test_get_and_parse_reading():
+    ser = rs232.SerialData(port='loop://', timeout=0.1, retry_limit=1, retry_delay=0.01)
+    ser.write('not json\n')
+    ser.write(to_json(dict(message='Hello world')) + '\n')
+    ts, reading = ser.get_and_parse_reading()
+    assert reading == dict(message='Hello world')
+
+    assert ser.get_and_parse_reading(retry_limit=1) is None
+    ser.disconnect()
+
+
+def test_read_available():
+    ser = rs232.SerialData(port='loop://', timeout=0.1)
+    ser.write('first\nsecond')
+    assert ser.read() == 'first\n'
+    ser.write('\nthird')
+    assert ser.read_available() == b'second\nthird'
+    assert ser.read_available() == b''
+    ser.disconnect()
+
+
+def test_read_bad_line():
+    ser = rs232.SerialData(port='loop://', timeout=0.1)
+    ser.write_bytes(b'\xffbad\ngood\n')
+    with pytest.raises(UnicodeDecodeError):
+        ser.read()
+    assert ser.read() == 'good\n'
+    ser.disconnect()
+
+
+def test_reading_timestamp(monkeypatch):
+    ser = rs232.SerialData(port='loop://', timeout=0.1)
+    now = 1577836800.25  # 2020-01-01T00:00:00.25 UTC
+    monkeypatch.setattr(rs232.time, 'time', lambda: now)
+
+    ser.write('first\nsecond\nthird\n')
+    ts0, _ = ser.get_reading()
+    assert ts0 == time.strftime('%Y-%m-%dT%H:%M:%S %Z', time.gmtime(1577836800))
+
+    # Same second, the same string is reused.
+    now += 0.5
+    ts1, _ = ser.get_reading()
+    assert ts1 is ts0
+
+    # Next second, a new string.
+    now += 0.5
+    ts2, _ = ser.get_reading()
+    assert ts2 != ts0
+    assert ts2 == time.strftime('%Y-%m-%dT%H:%M:%S %Z', time.gmtime(1577836801))
+    ser.disconnect()
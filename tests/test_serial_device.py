@@ -1,9 +1,34 @@
 import time
 
+from panoptes.utils.serial import device
 from panoptes.utils.serial.device import SerialDevice, SerialDeviceDefaults
 from panoptes.utils.serializers import from_json, to_json
 
 
+def test_port_info_cached():
+    ports = device.refresh_serial_port_info()
+    assert isinstance(ports, list)
+    assert device.get_serial_port_info() == ports
+    assert device.get_serial_port_info() is not ports
+    assert device._get_ports_cached() is device._get_ports_cached()
+
+    by_vidpid = device._get_ports_by_vidpid()
+    assert sum(len(matched) for matched in by_vidpid.values()) == len(ports)
+    for (vid, pid), matched in by_vidpid.items():
+        assert all(p.vid == vid and p.pid == pid for p in matched)
+
+
+def test_iter_candidate_ports():
+    ports = device.refresh_serial_port_info()
+    assert list(device.iter_candidate_ports(set())) == ports
+
+    if ports:
+        last = ports[-1]
+        candidates = list(device.iter_candidate_ports({(last.vid, last.pid)}))
+        assert candidates[0].vid == last.vid and candidates[0].pid == last.pid
+        assert sorted(candidates, key=lambda p: p.device) == ports
+
+
 def test_device():
     s0 = SerialDevice(port='loop://', name='My loop device')
     assert s0.is_connected
@@ -38,6 +63,13 @@ def test_write():
     time.sleep(0.5)
     assert s0.readings[0] == 'Hello world'
 
+    s0.write('Second line')
+    s0.write('Third line')
+    time.sleep(0.5)
+    assert s0.drain_readings(max_n=2) == ['Hello world', 'Second line']
+    assert s0.drain_readings() == ['Third line']
+    assert len(s0.readings) == 0
+
 
 def test_write_json():
     s0 = SerialDevice(port='loop://', reader_callback=from_json)
@@ -19,6 +19,9 @@ def test_load_c_library():
     libc = load_c_library('c', mode=None)
     assert libc._name[:4] == 'libc'
 
+    # The library is only loaded once.
+    assert load_c_library('c') is libc
+
 
 def test_load_c_library_fail():
     # Called without a `path` this will use find_library to locate libc.